@@ -20,6 +20,14 @@ class Config:
         'charset': 'utf8mb4'
     }
     
+    # 连接池配置，可用环境变量覆盖；pool_size按 进程数 × 每进程并发写库线程数 + 余量 设置，
+    # 连接在用到时才建立，较大的pool_size不会预先占用数据库连接
+    POOL_CONFIG = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 20)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 30)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),  # 等待空闲连接的秒数
+    }
+    
     # BaoStock配置
     BAOSTOCK_CONFIG = {
         'login_timeout': 30,
@@ -36,6 +44,8 @@ class Config:
         'default_start_date': '2020-01-01',  # 默认开始日期
         'default_end_date': None,  # 默认结束日期（None表示当前日期）
         'strict_error_handling': True,  # 严格异常处理，遇到错误立即停止
+        'upsert_max_outstanding': 256,  # 写库队列中最多积压的待写入项，超过时抓取线程等待
+        'db_workers': 4,  # 写库线程数，与抓取线程数（max_workers）分开设置
     }
     
     # 成分股类型配置
@@ -166,10 +176,10 @@ class Config:
     }
     
     @classmethod
-    def get_database_url(cls) -> str:
-        """获取数据库连接URL"""
+    def get_database_url(cls, driver: str = 'pymysql') -> str:
+        """获取数据库连接URL，driver为SQLAlchemy的MySQL驱动名（pymysql或mysqldb）"""
         config = cls.DATABASE_CONFIG
-        return f"mysql+pymysql://{config['user']}:{config['password']}@{config['host']}:{config['port']}/{config['database']}?charset={config['charset']}"
+        return f"mysql+{driver}://{config['user']}:{config['password']}@{config['host']}:{config['port']}/{config['database']}?charset={config['charset']}&local_infile=1"
     
     @classmethod
     def get_table_config(cls, table_name: str) -> Dict[str, Any]:
@@ -5,27 +5,231 @@
 """
 
 import logging
-from typing import List, Dict, Any, Optional, Set
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from typing import List, Dict, Any, Optional, Set, Tuple, Union
 from datetime import datetime, date, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import time
 
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from data_acquisition.data_fetcher import BaoStockDataFetcher
 from database.manager_fixed import DatabaseManagerFixed as DatabaseManager
 from config import Config
 
+# 进度条的刷新步长
+_PROGRESS_STEP = 32
+
+# 一次写入达到该行数时改用列式数据 + LOAD DATA写入
+_COLUMNAR_MIN_ROWS = 1000
+
+
+def _rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, list]:
+    """把按行的字典列表转换为按列存放的 {字段名: [值, ...]}"""
+    return {col: [row.get(col) for row in rows] for col in rows[0]}
+
+
+def _columns_to_rows(columns: Dict[str, list]) -> List[Dict[str, Any]]:
+    """把列式数据转换为按行的字典列表"""
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+def _entry_len(data: Union[List[Dict[str, Any]], Dict[str, list]]) -> int:
+    """写库队列中一项数据的行数，data为按行的字典列表或列式数据"""
+    if isinstance(data, dict):
+        return len(next(iter(data.values()), []))
+    return len(data)
+
+
+def _quarter_number(d) -> int:
+    """日期所在季度的连续编号：年份*4+季度序号(0-3)"""
+    return d.year * 4 + (d.month - 1) // 3
+
+
+@lru_cache(maxsize=64)
+def _year_quarters_cached(start_date: str, end_date: str) -> Tuple[Tuple[str, str], ...]:
+    """按日期范围生成 (年份, 季度) 组合，同一日期范围只计算一次"""
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    
+    # 按季度连续编号依次展开
+    first = _quarter_number(start)
+    last = _quarter_number(end)
+    return tuple((str(n // 4), str(n % 4 + 1)) for n in range(first, last + 1))
+
+
+class UpsertSubmissionQueue:
+    """
+    写库提交队列
+    
+    工作线程通过submit()放入待写入的数据后立即返回；db_workers个后台提交线程各自每次取出最多
+    max_batch项，按表合并后在一个事务中写入。队列中待写入的项达到max_outstanding时submit()阻塞，
+    避免抓取速度超过写库速度时无限占用内存
+    """
+    
+    def __init__(self, db_manager: DatabaseManager, max_outstanding: int = 256, max_batch: int = 64,
+                 db_workers: int = 1):
+        self.logger = logging.getLogger(__name__)
+        self.db_manager = db_manager
+        self.max_outstanding = max_outstanding
+        self.max_batch = max_batch
+        
+        self._entries = deque()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._closed = False
+        self._error: Optional[Exception] = None
+        
+        self._committers = [
+            threading.Thread(target=self._run, name=f'upsert-committer-{i}', daemon=True)
+            for i in range(db_workers)
+        ]
+        for committer in self._committers:
+            committer.start()
+    
+    def submit(self, table_name: str, rows: Union[List[Dict[str, Any]], Dict[str, list]], primary_keys: List[str]):
+        """
+        提交待写入的数据，提交线程写库失败后抛出该异常
+        
+        rows可以是按行的字典列表，也可以是列式数据 {字段名: [值, ...]}；
+        同一张表的各项数据字段需一致
+        """
+        with self._cond:
+            while len(self._entries) >= self.max_outstanding and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise Exception(f"写库失败: {str(self._error)}") from self._error
+            
+            self._entries.append((table_name, tuple(primary_keys), rows))
+            self._cond.notify_all()
+    
+    def flush(self):
+        """等待已提交的数据全部写入，期间写库失败则抛出异常"""
+        with self._cond:
+            while (self._entries or self._in_flight) and self._error is None:
+                self._cond.wait()
+            
+            error, self._error = self._error, None
+        
+        if error is not None:
+            raise error
+    
+    def close(self):
+        """写完剩余数据后停止提交线程"""
+        try:
+            self.flush()
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            for committer in self._committers:
+                committer.join()
+    
+    def _run(self):
+        """提交线程：取出一批数据写库，直到队列关闭且为空"""
+        while True:
+            with self._cond:
+                while not self._entries and not self._closed:
+                    self._cond.wait()
+                if not self._entries:
+                    return
+                
+                batch = [self._entries.popleft() for _ in range(min(self.max_batch, len(self._entries)))]
+                self._in_flight += len(batch)
+                self._cond.notify_all()
+            
+            try:
+                self._commit(batch)
+            except Exception as e:
+                self.logger.error(f"提交线程写库失败: {str(e)}")
+                with self._cond:
+                    if self._error is None:
+                        self._error = e
+            finally:
+                with self._cond:
+                    self._in_flight -= len(batch)
+                    self._cond.notify_all()
+    
+    def _commit(self, batch: List[Tuple[str, Tuple[str, ...], Union[List[Dict[str, Any]], Dict[str, list]]]]):
+        """按表合并一批数据，在同一个事务中写入"""
+        merged: Dict[Tuple[str, Tuple[str, ...]], list] = {}
+        for table_name, primary_keys, data in batch:
+            merged.setdefault((table_name, primary_keys), []).append(data)
+        
+        with self.db_manager.engine.begin() as conn:
+            for (table_name, primary_keys), entries in merged.items():
+                # 大批量数据按列式载入，少量数据直接executemany
+                if sum(_entry_len(data) for data in entries) >= _COLUMNAR_MIN_ROWS:
+                    columns: Dict[str, list] = {}
+                    for data in entries:
+                        if not isinstance(data, dict):
+                            data = _rows_to_columns(data)
+                        for col, values in data.items():
+                            columns.setdefault(col, []).extend(values)
+                    self.db_manager.copy_upsert(table_name, columns, list(primary_keys), conn=conn)
+                else:
+                    rows = []
+                    for data in entries:
+                        rows.extend(_columns_to_rows(data) if isinstance(data, dict) else data)
+                    self.db_manager.bulk_upsert(table_name, rows, list(primary_keys), conn=conn)
+
+
 class BatchProcessor:
-    """批量处理器"""
+    """
+    批量处理器
     
-    def __init__(self):
+    BaoStock客户端是基于单个登录会话的同步socket接口，没有HTTP/异步API，所有请求共用
+    模块级的同一个socket，并发请求会读到彼此的响应，因此各线程的抓取经_fetching串行执行。
+    线程池（大小由各方法的max_workers控制）中的线程在抓取之外并发完成数据整理和写库提交，
+    写库由写库队列的db_workers个提交线程完成，与抓取互不阻塞
+    """
+    
+    def __init__(self, db_workers: Optional[int] = None):
+        """
+        Args:
+            db_workers: 写库线程数，默认取Config.DATA_CONFIG['db_workers']
+        """
         self.logger = logging.getLogger(__name__)
+        self.config = Config.DATA_CONFIG
+        if db_workers is None:
+            db_workers = self.config['db_workers']
+        
         self.db_manager = DatabaseManager()
+        # 每个写库线程一个连接，另留一个给主线程的查询
+        self.db_manager.ensure_pool_size(db_workers + 1)
         self.data_fetcher = BaoStockDataFetcher()
-        self.config = Config.DATA_CONFIG
+        self.upsert_queue = UpsertSubmissionQueue(self.db_manager, self.config['upsert_max_outstanding'],
+                                                  db_workers=db_workers)
+        self._fetcher_lock = threading.Lock()
+        # 批处理失败时置位，尚未开始抓取的任务直接跳过
+        self._abort_event = threading.Event()
+        # 各批处理方法共用的线程池，按需创建
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_workers = 0
+    
+    def _get_executor(self, max_workers: int) -> ThreadPoolExecutor:
+        """获取共用的线程池，线程数与本次要求不同时才重建"""
+        if self._executor is None or self._executor_workers != max_workers:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            self._executor = ThreadPoolExecutor(max_workers=max_workers)
+            self._executor_workers = max_workers
+        return self._executor
+    
+    @contextmanager
+    def _fetching(self):
+        """
+        持有抓取锁，返回已登录的BaoStock会话
+        
+        baostock的登录状态和socket都是进程级的，所有线程共用同一个fetcher，
+        同一时刻只能有一个请求在途；会话未登录（如初始化时登录失败）时在这里重新登录
+        """
+        with self._fetcher_lock:
+            if not self.data_fetcher.is_logged_in:
+                self.data_fetcher._login()
+            yield self.data_fetcher
     
     def process_stock_list(self, index_type: str = 'all', 
                           update_basic_info: bool = True) -> List[str]:
@@ -109,8 +313,7 @@ class BatchProcessor:
             # 设置默认日期
             if not end_date:
                 # 使用当前日期作为结束日期
-                from datetime import date
-                end_date = date.today().strftime('%Y-%m-%d')
+                end_date = date.today().isoformat()
             
             if not start_date:
                 if incremental:
@@ -129,38 +332,67 @@ class BatchProcessor:
                 'failed_stocks': []
             }
             
+            self._abort_event.clear()
+            
+            # 增量更新时一次查询所有股票的最新日期，避免每只股票单独查询
+            latest_dates = {}
+            if incremental and stock_codes:
+                latest_dates = self.db_manager.get_latest_dates_bulk('stock_kline', 'date', 'code', stock_codes)
+                
+                # 已更新到结束日期的股票不再提交任务
+                end = date.fromisoformat(end_date)
+                up_to_date = {code for code, latest in latest_dates.items() if latest >= end}
+                if up_to_date:
+                    stock_codes = [code for code in stock_codes if code not in up_to_date]
+                    stats['total_stocks'] = len(stock_codes)
+                    self.logger.info(f"{len(up_to_date)} 只股票K线数据已是最新，需要更新 {len(stock_codes)} 只")
+            
             # 使用线程池并发处理
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 提交任务
-                future_to_code = {}
-                for code in stock_codes:
-                    future = executor.submit(
-                        self._process_single_stock_kline,
-                        code, start_date, end_date, frequency, adjustflag, incremental
-                    )
-                    future_to_code[future] = code
+            executor = self._get_executor(max_workers)
+            
+            # 按股票代码顺序提交，相邻完成的任务写入相近的索引页
+            future_to_code = {}
+            for code in sorted(stock_codes):
+                future = executor.submit(
+                    self._process_single_stock_kline,
+                    code, start_date, end_date, frequency, adjustflag, incremental,
+                    latest_dates.get(code)
+                )
+                future_to_code[future] = code
+            
+            # 处理结果
+            with tqdm(total=len(stock_codes), desc="处理K线数据", mininterval=0.5) as pbar:
+                completed = 0
+                for future in as_completed(future_to_code):
+                    code = future_to_code[future]
+                    try:
+                        result = future.result()
+                        if result['success']:
+                            stats['success_count'] += 1
+                            stats['total_records'] += result['records']
+                        else:
+                            # 遇到失败，立即抛出异常阻断处理
+                            error_fmt, error_args = "处理股票 %s 失败: %s", (code, result['error'])
+                            self.logger.error(error_fmt, *error_args)
+                            raise Exception(error_fmt % error_args)
+                    except Exception as e:
+                        # 遇到异常，取消排队中的任务后立即抛出，不等待其余股票处理完
+                        error_fmt, error_args = "处理股票 %s 异常: %s", (code, e)
+                        self.logger.error(error_fmt, *error_args)
+                        self._abort_event.set()
+                        for pending in future_to_code:
+                            pending.cancel()
+                        raise Exception(error_fmt % error_args) from e
+                    
+                    # 每完成一批再刷新进度条，减少加锁和重绘
+                    completed += 1
+                    if completed % _PROGRESS_STEP == 0:
+                        pbar.update(_PROGRESS_STEP)
                 
-                # 处理结果
-                with tqdm(total=len(stock_codes), desc="处理K线数据") as pbar:
-                    for future in as_completed(future_to_code):
-                        code = future_to_code[future]
-                        try:
-                            result = future.result()
-                            if result['success']:
-                                stats['success_count'] += 1
-                                stats['total_records'] += result['records']
-                            else:
-                                # 遇到失败，立即抛出异常阻断处理
-                                error_msg = f"处理股票 {code} 失败: {result['error']}"
-                                self.logger.error(error_msg)
-                                raise Exception(error_msg)
-                        except Exception as e:
-                            # 遇到异常，立即抛出异常阻断处理
-                            error_msg = f"处理股票 {code} 异常: {str(e)}"
-                            self.logger.error(error_msg)
-                            raise Exception(error_msg) from e
-                        
-                        pbar.update(1)
+                pbar.update(completed % _PROGRESS_STEP)
+            
+            # 等待队列中的数据写完
+            self.upsert_queue.flush()
             
             self.logger.info(f"K线数据处理完成: {stats}")
             return stats
@@ -170,33 +402,38 @@ class BatchProcessor:
             raise
     
     def _process_single_stock_kline(self, code: str, start_date: str, end_date: str,
-                                   frequency: str, adjustflag: str, incremental: bool) -> Dict[str, Any]:
-        """处理单只股票的K线数据"""
+                                   frequency: str, adjustflag: str, incremental: bool,
+                                   latest_date: Optional[date] = None) -> Dict[str, Any]:
+        """处理单只股票的K线数据，latest_date为预先批量查询的库中最新日期"""
+        if self._abort_event.is_set():
+            return {'success': False, 'error': '批处理已中止'}
+        
         try:
             # 如果是增量更新，检查最新日期
             if incremental:
-                latest_date = self.db_manager.get_latest_date('stock_kline', 'date', 'code', code)
                 if latest_date:
                     # 从最新日期的下一天开始
-                    next_date = (latest_date + timedelta(days=1)).strftime('%Y-%m-%d')
+                    next_date = (latest_date + timedelta(days=1)).isoformat()
                     if next_date > end_date:
                         return {'success': True, 'records': 0, 'message': '数据已是最新'}
                     start_date = next_date
             
-            # 获取K线数据
-            kline_data = self.data_fetcher.get_stock_kline_data(
-                code, start_date, end_date, frequency, adjustflag
-            )
+            # 获取K线数据，按列返回，不构建逐行的字典，写库时直接按列载入
+            with self._fetching() as fetcher:
+                kline_data = fetcher.get_stock_kline_data(
+                    code, start_date, end_date, frequency, adjustflag, columnar=True
+                )
+            records = _entry_len(kline_data)
             
-            if not kline_data:
+            if not records:
                 error_msg = f"股票 {code} 没有K线数据"
                 self.logger.warning(error_msg)
                 raise Exception(error_msg)
             
-            # 保存到数据库
-            self.db_manager.upsert_data('stock_kline', kline_data, ['code', 'date', 'frequency'])
+            # 提交到写库队列，与其他股票合并写入
+            self.upsert_queue.submit('stock_kline', kline_data, ['code', 'date', 'frequency'])
             
-            return {'success': True, 'records': len(kline_data)}
+            return {'success': True, 'records': records}
             
         except Exception as e:
             # 直接抛出异常，不再返回失败状态
@@ -207,7 +444,8 @@ class BatchProcessor:
     def process_financial_data(self, stock_codes: List[str], 
                               start_date: str, end_date: str,
                               data_types: List[str] = None,
-                              max_workers: int = 4) -> Dict[str, int]:
+                              max_workers: int = 4,
+                              incremental: bool = False) -> Dict[str, int]:
         """
         批量处理财务数据
         
@@ -217,6 +455,7 @@ class BatchProcessor:
             end_date: 结束日期
             data_types: 数据类型列表
             max_workers: 最大并发数
+            incremental: 是否增量更新，只抓取库中最新统计日期之后的季度
             
         Returns:
             处理结果统计
@@ -236,38 +475,63 @@ class BatchProcessor:
                 'failed_stocks': []
             }
             
+            self._abort_event.clear()
+            
+            # 所有股票共用同一组年份季度
+            year_quarters = _year_quarters_cached(start_date, end_date)
+            
+            # 按模式选定处理函数，增量模式预先批量查询各类型的最新统计日期
+            if incremental:
+                latest_stat_dates = {
+                    data_type: self.db_manager.get_latest_dates_bulk(f'stock_{data_type}', 'statDate', 'code', stock_codes)
+                    for data_type in data_types
+                }
+                worker = partial(self._process_single_stock_financial_incremental,
+                                 latest_stat_dates=latest_stat_dates)
+            else:
+                worker = self._process_single_stock_financial
+            
             # 使用线程池并发处理
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 提交任务
-                future_to_code = {}
-                for code in stock_codes:
-                    future = executor.submit(
-                        self._process_single_stock_financial,
-                        code, start_date, end_date, data_types
-                    )
-                    future_to_code[future] = code
+            executor = self._get_executor(max_workers)
+            
+            # 提交任务
+            future_to_code = {}
+            for code in sorted(stock_codes):
+                future = executor.submit(worker, code, year_quarters, data_types)
+                future_to_code[future] = code
+            
+            # 处理结果
+            with tqdm(total=len(stock_codes), desc="处理财务数据", mininterval=0.5) as pbar:
+                completed = 0
+                for future in as_completed(future_to_code):
+                    code = future_to_code[future]
+                    try:
+                        result = future.result()
+                        if result['success']:
+                            stats['success_count'] += 1
+                            stats['total_records'] += result['records']
+                        else:
+                            # 遇到失败，立即抛出异常阻断处理
+                            error_fmt, error_args = "处理股票 %s 失败: %s", (code, result['error'])
+                            self.logger.error(error_fmt, *error_args)
+                            raise Exception(error_fmt % error_args)
+                    except Exception as e:
+                        # 遇到异常，取消排队中的任务后立即抛出，不等待其余股票处理完
+                        error_fmt, error_args = "处理股票 %s 异常: %s", (code, e)
+                        self.logger.error(error_fmt, *error_args)
+                        self._abort_event.set()
+                        for pending in future_to_code:
+                            pending.cancel()
+                        raise Exception(error_fmt % error_args) from e
+                    
+                    completed += 1
+                    if completed % _PROGRESS_STEP == 0:
+                        pbar.update(_PROGRESS_STEP)
                 
-                # 处理结果
-                with tqdm(total=len(stock_codes), desc="处理财务数据") as pbar:
-                    for future in as_completed(future_to_code):
-                        code = future_to_code[future]
-                        try:
-                            result = future.result()
-                            if result['success']:
-                                stats['success_count'] += 1
-                                stats['total_records'] += result['records']
-                            else:
-                                # 遇到失败，立即抛出异常阻断处理
-                                error_msg = f"处理股票 {code} 失败: {result['error']}"
-                                self.logger.error(error_msg)
-                                raise Exception(error_msg)
-                        except Exception as e:
-                            # 遇到异常，立即抛出异常阻断处理
-                            error_msg = f"处理股票 {code} 异常: {str(e)}"
-                            self.logger.error(error_msg)
-                            raise Exception(error_msg) from e
-                        
-                        pbar.update(1)
+                pbar.update(completed % _PROGRESS_STEP)
+            
+            # 等待队列中的数据写完
+            self.upsert_queue.flush()
             
             self.logger.info(f"财务数据处理完成: {stats}")
             return stats
@@ -276,39 +540,75 @@ class BatchProcessor:
             self.logger.error(f"批量处理财务数据失败: {str(e)}")
             raise
     
-    def _process_single_stock_financial(self, code: str, start_date: str, end_date: str,
+    def _process_single_stock_financial(self, code: str, year_quarters: Tuple[Tuple[str, str], ...],
                                        data_types: List[str]) -> Dict[str, Any]:
         """处理单只股票的财务数据"""
+        if self._abort_event.is_set():
+            return {'success': False, 'error': '批处理已中止'}
+        
         try:
             total_records = 0
+            for data_type in data_types:
+                total_records += self._process_financial_quarters(code, data_type, year_quarters)
             
-            # 生成年份和季度的组合
-            year_quarters = self._generate_year_quarters(start_date, end_date)
+            return {'success': True, 'records': total_records}
             
+        except Exception as e:
+            # 直接抛出异常，不再返回失败状态
+            error_msg = f"处理股票 {code} 财务数据失败: {str(e)}"
+            self.logger.error(error_msg)
+            raise Exception(error_msg) from e
+    
+    def _process_single_stock_financial_incremental(self, code: str, year_quarters: Tuple[Tuple[str, str], ...],
+                                                   data_types: List[str],
+                                                   latest_stat_dates: Dict[str, Dict[str, date]]) -> Dict[str, Any]:
+        """
+        增量处理单只股票的财务数据，每种类型只抓取库中最新统计日期所在季度之后的季度
+        
+        Args:
+            latest_stat_dates: 预先批量查询的 {数据类型: {股票代码: 最新statDate}}
+        """
+        if self._abort_event.is_set():
+            return {'success': False, 'error': '批处理已中止'}
+        
+        try:
+            total_records = 0
+            # year_quarters按季度连续排列，缺失的季度总是其中的一段后缀，直接按编号切片
+            first = int(year_quarters[0][0]) * 4 + int(year_quarters[0][1]) - 1 if year_quarters else 0
             for data_type in data_types:
-                for year, quarter in year_quarters:
-                    # 获取财务数据
-                    financial_data = self.data_fetcher.get_financial_data(code, year, quarter, data_type)
-                    
-                    if financial_data:
-                        # 确定表名
-                        table_name = f'stock_{data_type}'
-                        
-                        # 确定主键
-                        primary_keys = ['code', 'statDate']
-                        
-                        # 保存到数据库
-                        self.db_manager.upsert_data(table_name, financial_data, primary_keys)
-                        total_records += len(financial_data)
+                latest = latest_stat_dates[data_type].get(code)
+                if latest is None:
+                    missing = year_quarters
+                else:
+                    missing = year_quarters[max(0, _quarter_number(latest) - first + 1):]
+                
+                total_records += self._process_financial_quarters(code, data_type, missing)
             
             return {'success': True, 'records': total_records}
             
         except Exception as e:
-            # 直接抛出异常，不再返回失败状态
             error_msg = f"处理股票 {code} 财务数据失败: {str(e)}"
             self.logger.error(error_msg)
             raise Exception(error_msg) from e
     
+    def _process_financial_quarters(self, code: str, data_type: str, year_quarters) -> int:
+        """抓取一只股票一种财务数据在指定季度的数据，合并后一次提交写库，返回记录数"""
+        # 汇总该类型所有季度的数据，每只股票每种类型只写入一次
+        type_rows = []
+        for year, quarter in year_quarters:
+            # 获取财务数据
+            with self._fetching() as fetcher:
+                financial_data = fetcher.get_financial_data(code, year, quarter, data_type)
+            
+            if financial_data:
+                type_rows.extend(financial_data)
+        
+        if type_rows:
+            # 提交到写库队列
+            self.upsert_queue.submit(f'stock_{data_type}', type_rows, ['code', 'statDate'])
+        
+        return len(type_rows)
+    
     def _generate_year_quarters(self, start_date: str, end_date: str) -> List[tuple]:
         """
         根据日期范围生成年份和季度的组合
@@ -320,37 +620,7 @@ class BatchProcessor:
         Returns:
             年份和季度的组合列表 [(year, quarter), ...]
         """
-        from datetime import datetime
-        
-        start_year = int(start_date[:4])
-        start_month = int(start_date[5:7])
-        end_year = int(end_date[:4])
-        end_month = int(end_date[5:7])
-        
-        year_quarters = []
-        
-        # 计算开始年份的季度
-        start_quarter = (start_month - 1) // 3 + 1
-        
-        # 计算结束年份的季度
-        end_quarter = (end_month - 1) // 3 + 1
-        
-        # 生成所有年份和季度的组合
-        for year in range(start_year, end_year + 1):
-            if year == start_year:
-                # 开始年份，从开始季度到第4季度
-                quarters = range(start_quarter, 5)
-            elif year == end_year:
-                # 结束年份，从第1季度到结束季度
-                quarters = range(1, end_quarter + 1)
-            else:
-                # 中间年份，包含所有季度
-                quarters = range(1, 5)
-            
-            for quarter in quarters:
-                year_quarters.append((str(year), str(quarter)))
-        
-        return year_quarters
+        return list(_year_quarters_cached(start_date, end_date))
     
     def process_performance_data(self, stock_codes: List[str],
                                 start_date: str, end_date: str,
@@ -385,35 +655,44 @@ class BatchProcessor:
             }
             
             # 使用线程池并发处理
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 提交任务
-                future_to_code = {}
-                for code in stock_codes:
-                    future = executor.submit(
-                        self._process_single_stock_performance,
-                        code, start_date, end_date, data_types
-                    )
-                    future_to_code[future] = code
-                
-                # 处理结果
-                with tqdm(total=len(stock_codes), desc="处理业绩数据") as pbar:
-                    for future in as_completed(future_to_code):
-                        code = future_to_code[future]
-                        try:
-                            result = future.result()
-                            if result['success']:
-                                stats['success_count'] += 1
-                                stats['total_records'] += result['records']
-                            else:
-                                stats['failed_count'] += 1
-                                stats['failed_stocks'].append(code)
-                                self.logger.error(f"处理股票 {code} 失败: {result['error']}")
-                        except Exception as e:
+            executor = self._get_executor(max_workers)
+            
+            # 提交任务
+            future_to_code = {}
+            for code in sorted(stock_codes):
+                future = executor.submit(
+                    self._process_single_stock_performance,
+                    code, start_date, end_date, data_types
+                )
+                future_to_code[future] = code
+            
+            # 处理结果
+            with tqdm(total=len(stock_codes), desc="处理业绩数据", mininterval=0.5) as pbar:
+                completed = 0
+                for future in as_completed(future_to_code):
+                    code = future_to_code[future]
+                    try:
+                        result = future.result()
+                        if result['success']:
+                            stats['success_count'] += 1
+                            stats['total_records'] += result['records']
+                        else:
                             stats['failed_count'] += 1
                             stats['failed_stocks'].append(code)
-                            self.logger.error(f"处理股票 {code} 异常: {str(e)}")
-                        
-                        pbar.update(1)
+                            self.logger.error("处理股票 %s 失败: %s", code, result['error'])
+                    except Exception as e:
+                        stats['failed_count'] += 1
+                        stats['failed_stocks'].append(code)
+                        self.logger.error("处理股票 %s 异常: %s", code, e)
+                    
+                    completed += 1
+                    if completed % _PROGRESS_STEP == 0:
+                        pbar.update(_PROGRESS_STEP)
+                
+                pbar.update(completed % _PROGRESS_STEP)
+            
+            # 等待队列中的数据写完
+            self.upsert_queue.flush()
             
             self.logger.info(f"业绩数据处理完成: {stats}")
             return stats
@@ -430,7 +709,8 @@ class BatchProcessor:
             
             for data_type in data_types:
                 # 获取业绩数据
-                performance_data = self.data_fetcher.get_performance_data(code, start_date, end_date, data_type)
+                with self._fetching() as fetcher:
+                    performance_data = fetcher.get_performance_data(code, start_date, end_date, data_type)
                 
                 if performance_data:
                     # 确定表名和主键
@@ -441,8 +721,8 @@ class BatchProcessor:
                         table_name = 'stock_forecast'
                         primary_keys = ['code', 'profitForcastExpStatDate']
                     
-                    # 保存到数据库
-                    self.db_manager.upsert_data(table_name, performance_data, primary_keys)
+                    # 提交到写库队列
+                    self.upsert_queue.submit(table_name, performance_data, primary_keys)
                     total_records += len(performance_data)
             
             return {'success': True, 'records': total_records}
@@ -472,8 +752,8 @@ class BatchProcessor:
             
             # 如果指定了股票代码，过滤数据
             if stock_codes:
-                filtered_data = [item for item in industry_data if item.get('code') in stock_codes]
-                industry_data = filtered_data
+                codes_set = frozenset(stock_codes)
+                industry_data = [item for item in industry_data if item.get('code') in codes_set]
             
             # 保存到数据库
             self.db_manager.upsert_data('stock_industry', industry_data, ['code'])
@@ -598,35 +878,44 @@ class BatchProcessor:
             }
             
             # 使用线程池并发处理
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 提交任务
-                future_to_code = {}
-                for code in stock_codes:
-                    future = executor.submit(
-                        self._process_single_stock_adjust_factor,
-                        code, start_date, end_date
-                    )
-                    future_to_code[future] = code
-                
-                # 处理结果
-                with tqdm(total=len(stock_codes), desc="处理复权因子数据") as pbar:
-                    for future in as_completed(future_to_code):
-                        code = future_to_code[future]
-                        try:
-                            result = future.result()
-                            if result['success']:
-                                stats['success_count'] += 1
-                                stats['total_records'] += result['records']
-                            else:
-                                stats['failed_count'] += 1
-                                stats['failed_stocks'].append(code)
-                                self.logger.error(f"处理股票 {code} 失败: {result['error']}")
-                        except Exception as e:
+            executor = self._get_executor(max_workers)
+            
+            # 提交任务
+            future_to_code = {}
+            for code in sorted(stock_codes):
+                future = executor.submit(
+                    self._process_single_stock_adjust_factor,
+                    code, start_date, end_date
+                )
+                future_to_code[future] = code
+            
+            # 处理结果
+            with tqdm(total=len(stock_codes), desc="处理复权因子数据", mininterval=0.5) as pbar:
+                completed = 0
+                for future in as_completed(future_to_code):
+                    code = future_to_code[future]
+                    try:
+                        result = future.result()
+                        if result['success']:
+                            stats['success_count'] += 1
+                            stats['total_records'] += result['records']
+                        else:
                             stats['failed_count'] += 1
                             stats['failed_stocks'].append(code)
-                            self.logger.error(f"处理股票 {code} 异常: {str(e)}")
-                        
-                        pbar.update(1)
+                            self.logger.error("处理股票 %s 失败: %s", code, result['error'])
+                    except Exception as e:
+                        stats['failed_count'] += 1
+                        stats['failed_stocks'].append(code)
+                        self.logger.error("处理股票 %s 异常: %s", code, e)
+                    
+                    completed += 1
+                    if completed % _PROGRESS_STEP == 0:
+                        pbar.update(_PROGRESS_STEP)
+                
+                pbar.update(completed % _PROGRESS_STEP)
+            
+            # 等待队列中的数据写完
+            self.upsert_queue.flush()
             
             self.logger.info(f"复权因子数据处理完成: {stats}")
             return stats
@@ -639,13 +928,14 @@ class BatchProcessor:
         """处理单只股票的复权因子数据"""
         try:
             # 获取复权因子数据
-            adjust_data = self.data_fetcher.get_adjust_factor_data(code, start_date, end_date)
+            with self._fetching() as fetcher:
+                adjust_data = fetcher.get_adjust_factor_data(code, start_date, end_date)
             
             if not adjust_data:
                 return {'success': True, 'records': 0, 'message': '无数据'}
             
-            # 保存到数据库
-            self.db_manager.upsert_data('stock_adjust_factor', adjust_data, ['code', 'dividOperateDate'])
+            # 提交到写库队列
+            self.upsert_queue.submit('stock_adjust_factor', adjust_data, ['code', 'dividOperateDate'])
             
             return {'success': True, 'records': len(adjust_data)}
             
@@ -680,35 +970,44 @@ class BatchProcessor:
             }
             
             # 使用线程池并发处理
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 提交任务
-                future_to_code = {}
-                for code in stock_codes:
-                    future = executor.submit(
-                        self._process_single_stock_dividend,
-                        code, year, year_type
-                    )
-                    future_to_code[future] = code
-                
-                # 处理结果
-                with tqdm(total=len(stock_codes), desc="处理除权除息数据") as pbar:
-                    for future in as_completed(future_to_code):
-                        code = future_to_code[future]
-                        try:
-                            result = future.result()
-                            if result['success']:
-                                stats['success_count'] += 1
-                                stats['total_records'] += result['records']
-                            else:
-                                stats['failed_count'] += 1
-                                stats['failed_stocks'].append(code)
-                                self.logger.error(f"处理股票 {code} 失败: {result['error']}")
-                        except Exception as e:
+            executor = self._get_executor(max_workers)
+            
+            # 提交任务
+            future_to_code = {}
+            for code in sorted(stock_codes):
+                future = executor.submit(
+                    self._process_single_stock_dividend,
+                    code, year, year_type
+                )
+                future_to_code[future] = code
+            
+            # 处理结果
+            with tqdm(total=len(stock_codes), desc="处理除权除息数据", mininterval=0.5) as pbar:
+                completed = 0
+                for future in as_completed(future_to_code):
+                    code = future_to_code[future]
+                    try:
+                        result = future.result()
+                        if result['success']:
+                            stats['success_count'] += 1
+                            stats['total_records'] += result['records']
+                        else:
                             stats['failed_count'] += 1
                             stats['failed_stocks'].append(code)
-                            self.logger.error(f"处理股票 {code} 异常: {str(e)}")
-                        
-                        pbar.update(1)
+                            self.logger.error("处理股票 %s 失败: %s", code, result['error'])
+                    except Exception as e:
+                        stats['failed_count'] += 1
+                        stats['failed_stocks'].append(code)
+                        self.logger.error("处理股票 %s 异常: %s", code, e)
+                    
+                    completed += 1
+                    if completed % _PROGRESS_STEP == 0:
+                        pbar.update(_PROGRESS_STEP)
+                
+                pbar.update(completed % _PROGRESS_STEP)
+            
+            # 等待队列中的数据写完
+            self.upsert_queue.flush()
             
             self.logger.info(f"除权除息数据处理完成: {stats}")
             return stats
@@ -721,13 +1020,14 @@ class BatchProcessor:
         """处理单只股票的除权除息数据"""
         try:
             # 获取除权除息数据
-            dividend_data = self.data_fetcher.get_dividend_data(code, year, year_type)
+            with self._fetching() as fetcher:
+                dividend_data = fetcher.get_dividend_data(code, year, year_type)
             
             if not dividend_data:
                 return {'success': True, 'records': 0, 'message': '无数据'}
             
-            # 保存到数据库
-            self.db_manager.upsert_data('stock_dividend', dividend_data, ['code', 'dividOperateDate'])
+            # 提交到写库队列
+            self.upsert_queue.submit('stock_dividend', dividend_data, ['code', 'dividOperateDate'])
             
             return {'success': True, 'records': len(dividend_data)}
             
@@ -736,6 +1036,14 @@ class BatchProcessor:
     
     def close(self):
         """关闭连接"""
+        if getattr(self, '_executor', None) is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if hasattr(self, 'upsert_queue'):
+            try:
+                self.upsert_queue.close()
+            except Exception as e:
+                self.logger.error(f"写入队列中剩余数据失败: {str(e)}")
         if hasattr(self, 'db_manager'):
             self.db_manager.close()
         if hasattr(self, 'data_fetcher'):
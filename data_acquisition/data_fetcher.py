@@ -5,18 +5,76 @@ BaoStock数据获取模块
 """
 
 import baostock as bs
-import pandas as pd
 import logging
 from typing import List, Dict, Any, Optional, Union
-from datetime import datetime, date, timedelta
+from datetime import date, timedelta
 import time
+import random
 import re
+import threading
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
 
+# 网络相关错误：按异常类型直接判断，其余异常再匹配错误信息中的关键字
+_NETWORK_ERROR_TYPES = (ConnectionError, TimeoutError, UnicodeDecodeError, OSError)
+_NETWORK_ERROR_RE = re.compile(r'网络接收错误|utf-8|codec|decompressing|invalid|connection|timeout|socket', re.I)
+
+# K线查询字段，各频率相同
+_KLINE_FIELDS = "date,code,open,close,high,low,preclose,volume,amount,adjustflag,turn,tradestatus,pctChg,peTTM,pbMRQ,psTTM,pcfNcfTTM,isST"
+_KLINE_FIELD_NAMES = tuple(_KLINE_FIELDS.split(','))
+
+# baostock的登录状态是进程级的：所有fetcher实例共用一次登录，按引用计数在最后一个实例登出时才登出
+_SESSION = {'refs': 0, 'logged': False, 'lock': threading.Lock()}
+
+
+def _drain(result) -> List[Dict[str, Any]]:
+    """
+    一次性读出BaoStock查询结果的所有行
+    
+    result.fields每次访问都会重新生成，只取一次；每行直接用dict(zip())按字段名构建字典
+    
+    Args:
+        result: BaoStock查询返回的结果集
+        
+    Returns:
+        以字段名为键的字典列表
+    """
+    field_names = result.fields
+    records = []
+    while result.next():
+        row_data = result.get_row_data()
+        if row_data:
+            records.append(dict(zip(field_names, row_data)))
+    return records
+
+
+def _drain_columns(result) -> Dict[str, List[Any]]:
+    """
+    一次性读出BaoStock查询结果，按列返回 {字段名: [值, ...]}
+    
+    不构建逐行的字典，行列转置由zip完成，供直接按列批量载入数据库的场景使用
+    
+    Args:
+        result: BaoStock查询返回的结果集
+        
+    Returns:
+        列式数据，没有数据时各列为空列表
+    """
+    field_names = result.fields
+    rows = []
+    while result.next():
+        row_data = result.get_row_data()
+        if row_data:
+            rows.append(row_data)
+    
+    if not rows:
+        return {field_name: [] for field_name in field_names}
+    return {field_name: list(values) for field_name, values in zip(field_names, zip(*rows))}
+
+
 class BaoStockDataFetcher:
     """BaoStock数据获取类"""
     
@@ -24,60 +82,86 @@ class BaoStockDataFetcher:
         self.logger = logging.getLogger(__name__)
         self.is_logged_in = False
         self.config = Config.BAOSTOCK_CONFIG
+        # 交易日历在一天之内不会变化，按天缓存查询结果
+        self._daily_cache: Dict[Any, Any] = {}
+        self._daily_cache_day: Optional[date] = None
         self._login()
     
     def _login(self):
-        """登录BaoStock"""
-        try:
-            result = bs.login()
-            if result.error_code == '0':
-                self.is_logged_in = True
-                self.logger.info("BaoStock登录成功")
+        """登录BaoStock，进程中已有登录会话时直接复用"""
+        with _SESSION['lock']:
+            if self.is_logged_in:
                 return True
-            else:
-                self.logger.error(f"BaoStock登录失败: {result.error_msg}")
-                return False
-        except Exception as e:
-            self.logger.error(f"BaoStock登录异常: {str(e)}")
-            return False
+            
+            if not _SESSION['logged']:
+                try:
+                    result = bs.login()
+                    if result.error_code != '0':
+                        self.logger.error(f"BaoStock登录失败: {result.error_msg}")
+                        return False
+                    _SESSION['logged'] = True
+                    self.logger.info("BaoStock登录成功")
+                except Exception as e:
+                    self.logger.error(f"BaoStock登录异常: {str(e)}")
+                    return False
+            
+            _SESSION['refs'] += 1
+            self.is_logged_in = True
+            return True
     
     def _logout(self):
-        """登出BaoStock"""
-        try:
-            if self.is_logged_in:
+        """释放本实例对登录会话的引用，最后一个实例释放时登出BaoStock"""
+        with _SESSION['lock']:
+            if not self.is_logged_in:
+                return
+            
+            self.is_logged_in = False
+            _SESSION['refs'] -= 1
+            if _SESSION['refs'] > 0 or not _SESSION['logged']:
+                return
+            
+            try:
                 bs.logout()
-                self.is_logged_in = False
                 self.logger.info("BaoStock登出成功")
-        except Exception as e:
-            self.logger.error(f"BaoStock登出异常: {str(e)}")
+            except Exception as e:
+                self.logger.error(f"BaoStock登出异常: {str(e)}")
+            finally:
+                _SESSION['logged'] = False
+    
+    def _get_daily_cache(self) -> Dict[Any, Any]:
+        """获取当天的缓存，日期变化后清空"""
+        today = date.today()
+        if self._daily_cache_day != today:
+            self._daily_cache = {}
+            self._daily_cache_day = today
+        return self._daily_cache
     
     def _retry_request(self, func, *args, **kwargs):
         """重试请求"""
         last_exception = None
+        delay = self.config['retry_delay']
         for attempt in range(self.config['max_retries']):
             try:
                 return func(*args, **kwargs)
             except Exception as e:
                 last_exception = e
-                error_str = str(e).lower()
                 
                 # 检查是否是网络相关错误
-                is_network_error = any(keyword in error_str for keyword in [
-                    '网络接收错误', 'utf-8', 'codec', 'decompressing', 
-                    'invalid', 'connection', 'timeout', 'socket'
-                ])
+                is_network_error = (isinstance(e, _NETWORK_ERROR_TYPES)
+                                    or _NETWORK_ERROR_RE.search(str(e)) is not None)
                 
                 if attempt == self.config['max_retries'] - 1:
                     # 最后一次重试失败，抛出异常
                     self.logger.error(f"请求失败，已重试{self.config['max_retries']}次: {str(e)}")
                     raise Exception(f"请求失败，已重试{self.config['max_retries']}次: {str(e)}") from e
                 
-                # 计算延迟时间（指数退避）
-                delay = self.config['retry_delay'] * (2 ** attempt)
+                # 计算延迟时间（带去相关抖动的指数退避），避免并发线程同时重试，最大30秒
+                base = self.config['retry_delay']
                 if is_network_error:
-                    delay = min(delay * 2, 30)  # 网络错误使用更长的延迟，最大30秒
+                    base *= 2  # 网络错误使用更长的延迟
+                delay = min(30, random.uniform(base, max(base, delay * 3)))
                 
-                self.logger.warning(f"请求失败，第{attempt + 1}次重试，{delay}秒后重试: {str(e)}")
+                self.logger.warning(f"请求失败，第{attempt + 1}次重试，{delay:.1f}秒后重试: {str(e)}")
                 time.sleep(delay)
         
         # 如果所有重试都失败，抛出最后一个异常
@@ -103,7 +187,7 @@ class BaoStockDataFetcher:
             
             if function_name == 'query_all_stock':
                 # 获取所有股票需要指定日期
-                today = datetime.now().strftime('%Y-%m-%d')
+                today = date.today().isoformat()
                 result = bs.query_all_stock(day=today)
             else:
                 # 成分股接口不需要参数
@@ -112,20 +196,7 @@ class BaoStockDataFetcher:
             if result.error_code != '0':
                 raise Exception(f"获取股票列表失败: {result.error_msg}")
             
-            stocks = []
-            while result.next():
-                row_data = result.get_row_data()
-                if row_data:
-                    # 根据字段名构建字典
-                    field_names = result.fields
-                    stock_info = {}
-                    
-                    for i, value in enumerate(row_data):
-                        if i < len(field_names):
-                            field_name = field_names[i]
-                            stock_info[field_name] = value
-                    
-                    stocks.append(stock_info)
+            stocks = _drain(result)
             
             self.logger.info(f"获取到 {len(stocks)} 只股票")
             return stocks
@@ -150,19 +221,7 @@ class BaoStockDataFetcher:
             if result.error_code != '0':
                 raise Exception(f"获取股票基本信息失败: {result.error_msg}")
             
-            stocks = []
-            while result.next():
-                row_data = result.get_row_data()
-                if row_data:
-                    field_names = result.fields
-                    stock_info = {}
-                    
-                    for i, value in enumerate(row_data):
-                        if i < len(field_names):
-                            field_name = field_names[i]
-                            stock_info[field_name] = value
-                    
-                    stocks.append(stock_info)
+            stocks = _drain(result)
             
             self.logger.info(f"获取到 {len(stocks)} 条股票基本信息")
             return stocks
@@ -172,7 +231,8 @@ class BaoStockDataFetcher:
             raise
     
     def get_stock_kline_data(self, code: str, start_date: str, end_date: str, 
-                           frequency: str = 'd', adjustflag: str = '3') -> List[Dict[str, Any]]:
+                           frequency: str = 'd', adjustflag: str = '3',
+                           columnar: bool = False) -> Union[List[Dict[str, Any]], Dict[str, List[Any]]]:
         """
         获取股票K线数据
         
@@ -182,21 +242,19 @@ class BaoStockDataFetcher:
             end_date: 结束日期 (YYYY-MM-DD)
             frequency: 数据频率 ('d', 'w', 'm', '5', '15', '30', '60')
             adjustflag: 复权类型 ('1', '2', '3')
+            columnar: 是否按列返回 {字段名: [值, ...]}，不构建逐行的字典
             
         Returns:
-            K线数据列表
+            K线数据列表，columnar为True时为列式数据
             
         Raises:
             Exception: 当获取数据失败时抛出异常
         """
         def _fetch_kline_data():
             """内部获取K线数据的函数"""
-            # 构建字段列表
-            fields = "date,code,open,close,high,low,preclose,volume,amount,adjustflag,turn,tradestatus,pctChg,peTTM,pbMRQ,psTTM,pcfNcfTTM,isST"
-            
             result = bs.query_history_k_data_plus(
                 code=code,
-                fields=fields,
+                fields=_KLINE_FIELDS,
                 start_date=start_date,
                 end_date=end_date,
                 frequency=frequency,
@@ -208,27 +266,20 @@ class BaoStockDataFetcher:
                 self.logger.error(error_msg)
                 raise Exception(error_msg)
             
-            kline_data = []
+            # 返回字段与请求不一致时每次查询只记录一次，不再逐行检查
+            if tuple(result.fields) != _KLINE_FIELD_NAMES:
+                self.logger.warning(f"K线返回字段与请求不一致: {result.fields}")
+            
             try:
-                while result.next():
-                    row_data = result.get_row_data()
-                    if row_data:
-                        field_names = result.fields
-                        kline_info = {}
-                        
-                        # 确保字段数量匹配
-                        min_length = min(len(row_data), len(field_names))
-                        for i in range(min_length):
-                            field_name = field_names[i]
-                            kline_info[field_name] = row_data[i]
-                        
-                        # 如果数据字段多于字段名，记录警告
-                        if len(row_data) > len(field_names):
-                            self.logger.warning(f"数据字段数量({len(row_data)})多于字段名数量({len(field_names)})")
-                        
-                        # 添加频率信息
+                if columnar:
+                    kline_data = _drain_columns(result)
+                    # 添加频率信息
+                    kline_data['frequency'] = [frequency] * len(kline_data['date'])
+                else:
+                    kline_data = _drain(result)
+                    # 添加频率信息
+                    for kline_info in kline_data:
                         kline_info['frequency'] = frequency
-                        kline_data.append(kline_info)
             except Exception as e:
                 error_msg = f"解析K线数据失败: {str(e)}"
                 self.logger.error(error_msg)
@@ -239,13 +290,14 @@ class BaoStockDataFetcher:
         try:
             # 使用重试机制获取数据
             kline_data = self._retry_request(_fetch_kline_data)
+            row_count = len(kline_data['frequency']) if columnar else len(kline_data)
             
-            if len(kline_data) == 0:
+            if row_count == 0:
                 error_msg = f"股票 {code} 在指定时间范围内没有K线数据"
                 self.logger.warning(error_msg)
                 raise Exception(error_msg)
             
-            self.logger.info(f"获取到 {len(kline_data)} 条K线数据")
+            self.logger.info(f"获取到 {row_count} 条K线数据")
             return kline_data
             
         except Exception as e:
@@ -289,19 +341,7 @@ class BaoStockDataFetcher:
             if result.error_code != '0':
                 raise Exception(f"获取{data_type}数据失败: {result.error_msg}")
             
-            financial_data = []
-            while result.next():
-                row_data = result.get_row_data()
-                if row_data:
-                    field_names = result.fields
-                    financial_info = {}
-                    
-                    for i, value in enumerate(row_data):
-                        if i < len(field_names):
-                            field_name = field_names[i]
-                            financial_info[field_name] = value
-                    
-                    financial_data.append(financial_info)
+            financial_data = _drain(result)
             
             self.logger.info(f"获取到 {len(financial_data)} 条{data_type}数据")
             return financial_data
@@ -342,19 +382,7 @@ class BaoStockDataFetcher:
             if result.error_code != '0':
                 raise Exception(f"获取{data_type}数据失败: {result.error_msg}")
             
-            performance_data = []
-            while result.next():
-                row_data = result.get_row_data()
-                if row_data:
-                    field_names = result.fields
-                    performance_info = {}
-                    
-                    for i, value in enumerate(row_data):
-                        if i < len(field_names):
-                            field_name = field_names[i]
-                            performance_info[field_name] = value
-                    
-                    performance_data.append(performance_info)
+            performance_data = _drain(result)
             
             self.logger.info(f"获取到 {len(performance_data)} 条{data_type}数据")
             return performance_data
@@ -379,19 +407,7 @@ class BaoStockDataFetcher:
             if result.error_code != '0':
                 raise Exception(f"获取行业分类数据失败: {result.error_msg}")
             
-            industry_data = []
-            while result.next():
-                row_data = result.get_row_data()
-                if row_data:
-                    field_names = result.fields
-                    industry_info = {}
-                    
-                    for i, value in enumerate(row_data):
-                        if i < len(field_names):
-                            field_name = field_names[i]
-                            industry_info[field_name] = value
-                    
-                    industry_data.append(industry_info)
+            industry_data = _drain(result)
             
             self.logger.info(f"获取到 {len(industry_data)} 条行业分类数据")
             return industry_data
@@ -409,30 +425,24 @@ class BaoStockDataFetcher:
             end_date: 结束日期
             
         Returns:
-            交易日历数据列表
+            交易日历数据列表，同一天内相同日期范围的查询直接返回缓存结果
         """
         try:
+            cache = self._get_daily_cache()
+            cache_key = ('trade_dates', start_date, end_date)
+            if cache_key in cache:
+                return list(cache[cache_key])
+            
             result = bs.query_trade_dates(start_date=start_date, end_date=end_date)
             
             if result.error_code != '0':
                 raise Exception(f"获取交易日历失败: {result.error_msg}")
             
-            trade_dates = []
-            while result.next():
-                row_data = result.get_row_data()
-                if row_data:
-                    field_names = result.fields
-                    trade_info = {}
-                    
-                    for i, value in enumerate(row_data):
-                        if i < len(field_names):
-                            field_name = field_names[i]
-                            trade_info[field_name] = value
-                    
-                    trade_dates.append(trade_info)
+            trade_dates = _drain(result)
+            cache[cache_key] = trade_dates
             
             self.logger.info(f"获取到 {len(trade_dates)} 条交易日历数据")
-            return trade_dates
+            return list(trade_dates)
             
         except Exception as e:
             self.logger.error(f"获取交易日历失败: {str(e)}")
@@ -476,19 +486,7 @@ class BaoStockDataFetcher:
             if result.error_code != '0':
                 raise Exception(f"获取{data_type}数据失败: {result.error_msg}")
             
-            macro_data = []
-            while result.next():
-                row_data = result.get_row_data()
-                if row_data:
-                    field_names = result.fields
-                    macro_info = {}
-                    
-                    for i, value in enumerate(row_data):
-                        if i < len(field_names):
-                            field_name = field_names[i]
-                            macro_info[field_name] = value
-                    
-                    macro_data.append(macro_info)
+            macro_data = _drain(result)
             
             self.logger.info(f"获取到 {len(macro_data)} 条{data_type}数据")
             return macro_data
@@ -519,19 +517,7 @@ class BaoStockDataFetcher:
             if result.error_code != '0':
                 raise Exception(f"获取复权因子数据失败: {result.error_msg}")
             
-            adjust_data = []
-            while result.next():
-                row_data = result.get_row_data()
-                if row_data:
-                    field_names = result.fields
-                    adjust_info = {}
-                    
-                    for i, value in enumerate(row_data):
-                        if i < len(field_names):
-                            field_name = field_names[i]
-                            adjust_info[field_name] = value
-                    
-                    adjust_data.append(adjust_info)
+            adjust_data = _drain(result)
             
             self.logger.info(f"获取到 {len(adjust_data)} 条复权因子数据")
             return adjust_data
@@ -562,19 +548,7 @@ class BaoStockDataFetcher:
             if result.error_code != '0':
                 raise Exception(f"获取除权除息数据失败: {result.error_msg}")
             
-            dividend_data = []
-            while result.next():
-                row_data = result.get_row_data()
-                if row_data:
-                    field_names = result.fields
-                    dividend_info = {}
-                    
-                    for i, value in enumerate(row_data):
-                        if i < len(field_names):
-                            field_name = field_names[i]
-                            dividend_info[field_name] = value
-                    
-                    dividend_data.append(dividend_info)
+            dividend_data = _drain(result)
             
             self.logger.info(f"获取到 {len(dividend_data)} 条除权除息数据")
             return dividend_data
@@ -584,23 +558,27 @@ class BaoStockDataFetcher:
             raise
     
     def get_latest_trading_date(self) -> str:
-        """获取最新交易日"""
+        """获取最新交易日，结果当天内缓存"""
+        today = date.today()
+        today_str = today.isoformat()
         try:
-            today = datetime.now()
-            # 向前查找最近的交易日
-            for i in range(10):  # 最多向前查找10天
-                check_date = (today - timedelta(days=i)).strftime('%Y-%m-%d')
-                trade_dates = self.get_trade_dates(check_date, check_date)
-                
-                if trade_dates and trade_dates[0].get('is_trading_day') == '1':
-                    return check_date
+            cache = self._get_daily_cache()
+            if 'latest_trading_date' in cache:
+                return cache['latest_trading_date']
+            
+            # 一次查询最近10天的交易日历，从后向前找最近的交易日
+            trade_dates = self.get_trade_dates((today - timedelta(days=9)).isoformat(), today_str)
+            for trade_date in reversed(trade_dates):
+                if trade_date.get('is_trading_day') == '1':
+                    cache['latest_trading_date'] = trade_date['calendar_date']
+                    return trade_date['calendar_date']
             
             # 如果没找到，返回今天
-            return today.strftime('%Y-%m-%d')
+            return today_str
             
         except Exception as e:
             self.logger.error(f"获取最新交易日失败: {str(e)}")
-            return datetime.now().strftime('%Y-%m-%d')
+            return today_str
     
     def __enter__(self):
         return self
@@ -8,6 +8,9 @@ import click
 import logging
 import sys
 import time
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime, date, timedelta
 from typing import List, Optional
 
@@ -18,14 +21,26 @@ from config import Config
 from database.manager_fixed import DatabaseManagerFixed as DatabaseManager
 from data_acquisition.batch_processor import BatchProcessor
 
-# 配置日志
+# 配置日志：各线程只把日志记录放入队列，由后台线程写入文件和终端
+_log_formatter = logging.Formatter(Config.LOG_CONFIG['format'])
+_log_handlers = [
+    logging.FileHandler(Config.LOG_CONFIG['file'], encoding='utf-8'),
+    logging.StreamHandler(sys.stdout)
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+
+_log_listener = QueueListener(queue.Queue(-1), *_log_handlers)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# 队列中只放消息本身，格式化由后台线程的处理器完成
+_queue_handler = QueueHandler(_log_listener.queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
 logging.basicConfig(
     level=getattr(logging, Config.LOG_CONFIG['level']),
-    format=Config.LOG_CONFIG['format'],
-    handlers=[
-        logging.FileHandler(Config.LOG_CONFIG['file'], encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
+    handlers=[_queue_handler]
 )
 
 logger = logging.getLogger(__name__)
@@ -144,8 +159,9 @@ def update_kline(index_type, start_date, end_date, frequency, adjustflag, increm
 @click.option('--start-date', help='开始日期 (YYYY-MM-DD)，默认使用2020-01-01')
 @click.option('--end-date', help='结束日期 (YYYY-MM-DD)，默认使用当前日期')
 @click.option('--data-types', help='数据类型，逗号分隔 (profit,operation,growth,balance,cashflow,dupont)')
+@click.option('--incremental', is_flag=True, help='增量更新，只抓取库中最新统计日期之后的季度')
 @click.option('--max-workers', default=2, help='最大并发数')
-def update_financial(index_type, start_date, end_date, data_types, max_workers):
+def update_financial(index_type, start_date, end_date, data_types, incremental, max_workers):
     """更新财务数据"""
     try:
         logger.info(f"开始更新{index_type}财务数据...")
@@ -179,7 +195,8 @@ def update_financial(index_type, start_date, end_date, data_types, max_workers):
                 start_date=start_date,
                 end_date=end_date,
                 data_types=data_type_list,
-                max_workers=max_workers
+                max_workers=max_workers,
+                incremental=incremental
             )
         
         logger.info(f"财务数据更新完成: {stats}")
@@ -5,22 +5,260 @@
 以stock_kline为主表，关联所有DWD财务数据和行业分类数据
 """
 
-import pandas as pd
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 import sys
 import os
+import json
+import time
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database.manager_fixed import DatabaseManagerFixed as DatabaseManager
-from sqlalchemy import text
+from config import Config
+from sqlalchemy import text, bindparam
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql.elements import TextClause
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# 基础因子表字段来源，唯一的字段定义处：{分组: (表别名, 来源表, [字段, ...])}
+# DWD分组额外带出 pubDate/statDate，在基础因子表中以 {分组}_pubDate/{分组}_statDate 存储
+BASE_FACTOR_COLUMN_GROUPS = {
+    'kline': ('k', 'stock_kline', [
+        'frequency', 'open', 'high', 'low', 'close', 'preclose', 'volume', 'amount',
+        'adjustflag', 'turn', 'tradestatus', 'pctChg', 'peTTM', 'pbMRQ', 'psTTM', 'pcfNcfTTM', 'isST'
+    ]),
+    'industry': ('i', 'stock_industry', [
+        'code_name', 'industry', 'industryClassification'
+    ]),
+    'profit': ('p', 'dwd_stock_profit', [
+        'roeAvg', 'npMargin', 'gpMargin', 'netProfit', 'epsTTM', 'MBRevenue', 'totalShare', 'liqaShare'
+    ]),
+    'balance': ('b', 'dwd_stock_balance', [
+        'currentRatio', 'quickRatio', 'cashRatio', 'YOYLiability', 'liabilityToAsset', 'assetToEquity'
+    ]),
+    'cashflow': ('c', 'dwd_stock_cashflow', [
+        'CAToAsset', 'NCAToAsset', 'tangibleAssetToAsset', 'ebitToInterest', 'CFOToOR', 'CFOToNP', 'CFOToGr'
+    ]),
+    'operation': ('o', 'dwd_stock_operation', [
+        'NRTurnRatio', 'NRTurnDays', 'INVTurnRatio', 'INVTurnDays', 'CATurnRatio', 'AssetTurnRatio'
+    ]),
+    'growth': ('g', 'dwd_stock_growth', [
+        'YOYEquity', 'YOYAsset', 'YOYNI', 'YOYEPSBasic', 'YOYPNI'
+    ]),
+    'dupont': ('d', 'dwd_stock_dupont', [
+        'dupontROE', 'dupontAssetStoEquity', 'dupontAssetTurn', 'dupontPnitoni', 'dupontNitogr',
+        'dupontTaxBurden', 'dupontIntburden', 'dupontEbittogr'
+    ]),
+}
+
+_DWD_DATE_COLUMNS = ('pubDate', 'statDate')
+
+# 全量重建时写入的临时表
+BASE_FACTOR_STAGE_TABLE = 'dwd_stock_base_factor_new'
+
+# 基础因子数据的最早日期，填充的开始日期不早于此
+BASE_FACTOR_MIN_DATE = '2020-06-01'
+
+
+def _base_factor_column_pairs(groups: Dict[str, Tuple[str, str, List[str]]]) -> List[Tuple[str, str]]:
+    """生成 (目标字段, 来源表达式) 列表，主键在前"""
+    pairs = [('code', 'k.code'), ('date', 'k.date')]
+    for group, (alias, table, columns) in groups.items():
+        pairs.extend((col, f'{alias}.{col}') for col in columns)
+        if table.startswith('dwd_'):
+            pairs.extend((f'{group}_{col}', f'{alias}.{col}') for col in _DWD_DATE_COLUMNS)
+    return pairs
+
+
+def _build_select_sql(groups: Dict[str, Tuple[str, str, List[str]]], codes_filter: bool = False,
+                      date_filter: bool = True) -> str:
+    """
+    生成基础因子数据的SELECT语句
+    
+    以stock_kline为主表；stock_industry可能一只股票有多种行业分类，先用ROW_NUMBER()
+    每个code只保留一行，避免关联后K线行被放大；含窗口函数的派生表只物化一次，
+    再按code探测；DWD表以(code, date)为主键，按主键关联
+    """
+    pairs = _base_factor_column_pairs(groups)
+    select_list = ',\n    '.join(expr for _, expr in pairs)
+    
+    joins = []
+    for group, (alias, table, columns) in groups.items():
+        if table == 'stock_kline':
+            continue
+        if table == 'stock_industry':
+            joins.append(
+                f"LEFT JOIN (\n    SELECT code, {', '.join(columns)},\n"
+                f"        ROW_NUMBER() OVER (PARTITION BY code ORDER BY industryClassification DESC) AS rn\n"
+                f"    FROM {table}\n) {alias} ON k.code = {alias}.code AND {alias}.rn = 1"
+            )
+        else:
+            joins.append(f"LEFT JOIN {table} {alias} ON k.code = {alias}.code AND k.date = {alias}.date")
+    
+    conditions = []
+    if date_filter:
+        conditions.append("k.date BETWEEN :start_date AND :end_date")
+    if codes_filter:
+        conditions.append("k.code IN :codes")
+    
+    sql = (
+        f"SELECT\n    {select_list}\n"
+        f"FROM stock_kline k\n"
+        + '\n'.join(joins) + "\n"
+    )
+    if conditions:
+        sql += "WHERE " + "\nAND ".join(conditions) + "\n"
+    return sql
+
+
+def _build_upsert_sql(groups: Dict[str, Tuple[str, str, List[str]]],
+                      target_table: str = 'dwd_stock_base_factor',
+                      upsert: bool = True, codes_filter: bool = False,
+                      date_filter: bool = True) -> str:
+    """
+    由字段分组生成INSERT ... SELECT语句
+    
+    INSERT字段列表、SELECT列表和ON DUPLICATE KEY UPDATE子句出自同一份字段定义，
+    避免三处手写字段不一致
+    
+    Args:
+        groups: 字段分组
+        target_table: 写入的目标表
+        upsert: 是否附加ON DUPLICATE KEY UPDATE子句
+        codes_filter: 是否附加按股票代码过滤的条件（:codes 以 expanding 方式绑定）
+        date_filter: 是否附加按日期区间过滤的条件（:start_date/:end_date）
+    """
+    targets = [target for target, _ in _base_factor_column_pairs(groups)]
+    sql = (
+        f"INSERT INTO {target_table} (\n    {', '.join(targets)}\n)\n"
+        f"{_build_select_sql(groups, codes_filter, date_filter)}"
+    )
+    if upsert:
+        updates = [f'{col} = VALUES({col})' for col in targets if col not in ('code', 'date')]
+        updates.append('updated_at = CURRENT_TIMESTAMP')
+        sql += "ON DUPLICATE KEY UPDATE\n    " + ',\n    '.join(updates) + "\n"
+    return sql
+
+
+# 基础因子表UPSERT语句，模块加载时构建一次，用于增量更新
+BASE_FACTOR_UPSERT_SQL = _build_upsert_sql(BASE_FACTOR_COLUMN_GROUPS)
+
+# 全量重建使用的纯INSERT语句，写入空的临时表，无需逐行检查主键冲突
+BASE_FACTOR_INSERT_SQL = _build_upsert_sql(
+    BASE_FACTOR_COLUMN_GROUPS, target_table=BASE_FACTOR_STAGE_TABLE, upsert=False
+)
+
+# 按股票代码分区并行执行时使用的版本
+BASE_FACTOR_UPSERT_BY_CODES_SQL = _build_upsert_sql(BASE_FACTOR_COLUMN_GROUPS, codes_filter=True)
+BASE_FACTOR_INSERT_BY_CODES_SQL = _build_upsert_sql(
+    BASE_FACTOR_COLUMN_GROUPS, target_table=BASE_FACTOR_STAGE_TABLE, upsert=False, codes_filter=True
+)
+
+# 实时关联视图：字段与基础因子表一致，供可以接受关联延迟的查询直接使用
+BASE_FACTOR_VIEW = 'v_stock_base_factor'
+BASE_FACTOR_VIEW_SQL = (
+    f"CREATE OR REPLACE VIEW {BASE_FACTOR_VIEW} (\n"
+    f"    {', '.join(target for target, _ in _base_factor_column_pairs(BASE_FACTOR_COLUMN_GROUPS))}\n"
+    f") AS\n{_build_select_sql(BASE_FACTOR_COLUMN_GROUPS, date_filter=False)}"
+)
+
+# 快照刷新：不带日期条件一次性写入临时表，随后与正式表交换
+BASE_FACTOR_SNAPSHOT_SQL = _build_upsert_sql(
+    BASE_FACTOR_COLUMN_GROUPS, target_table=BASE_FACTOR_STAGE_TABLE, upsert=False, date_filter=False
+)
+
+# 分组填充：先写入K线和行业的骨架行，再按DWD分组逐个UPDATE ... INNER JOIN
+BASE_FACTOR_SKELETON_UPSERT_SQL = _build_upsert_sql({
+    group: BASE_FACTOR_COLUMN_GROUPS[group] for group in ('kline', 'industry')
+})
+
+
+def _build_group_update_sql(group: str) -> str:
+    """生成用单个DWD分组更新基础因子表的UPDATE ... INNER JOIN语句"""
+    alias, table, columns = BASE_FACTOR_COLUMN_GROUPS[group]
+    assignments = [f'bf.{col} = {alias}.{col}' for col in columns]
+    assignments.extend(f'bf.{group}_{col} = {alias}.{col}' for col in _DWD_DATE_COLUMNS)
+    return (
+        f"UPDATE dwd_stock_base_factor bf\n"
+        f"INNER JOIN {table} {alias} ON bf.code = {alias}.code AND bf.date = {alias}.date\n"
+        f"SET " + ', '.join(assignments) + "\n"
+        f"WHERE bf.date BETWEEN :start_date AND :end_date\n"
+    )
+
+
+# 来自DWD财务表的分组
+_DWD_GROUPS = tuple(
+    group for group, (_, table, _) in BASE_FACTOR_COLUMN_GROUPS.items() if table.startswith('dwd_')
+)
+
+BASE_FACTOR_GROUP_UPDATE_SQL = {group: _build_group_update_sql(group) for group in _DWD_GROUPS}
+
+# 基础因子表汇总统计：一次扫描中用条件求和完成各项覆盖率计数
+BASE_FACTOR_SUMMARY_SQL = (
+    "SELECT COUNT(*), COUNT(DISTINCT code), MIN(date), MAX(date), SUM(industry IS NOT NULL), "
+    + ', '.join(f"SUM({group}_pubDate IS NOT NULL)" for group in _DWD_GROUPS)
+    + " FROM dwd_stock_base_factor"
+)
+
+
+def _iter_date_chunks(start_date: str, end_date: str, days: int = 30) -> Iterator[Tuple[str, str]]:
+    """
+    按固定天数切分日期区间
+
+    Args:
+        start_date: 开始日期 (YYYY-MM-DD)
+        end_date: 结束日期 (YYYY-MM-DD)
+        days: 每个区间的天数
+
+    Yields:
+        (区间开始日期, 区间结束日期)，均包含端点
+    """
+    chunk_start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    last = datetime.strptime(end_date, '%Y-%m-%d').date()
+    step = timedelta(days=days)
+
+    while chunk_start <= last:
+        chunk_end = min(chunk_start + step - timedelta(days=1), last)
+        yield chunk_start.isoformat(), chunk_end.isoformat()
+        chunk_start = chunk_end + timedelta(days=1)
+
+
 class BaseFactorProcessor:
     """基础因子表处理器"""
     
+    # 预编译的填充语句，类加载时构建一次
+    _UPSERT_STMT = text(BASE_FACTOR_UPSERT_SQL)
+    _INSERT_STMT = text(BASE_FACTOR_INSERT_SQL)
+    _UPSERT_BY_CODES_STMT = text(BASE_FACTOR_UPSERT_BY_CODES_SQL).bindparams(bindparam('codes', expanding=True))
+    _INSERT_BY_CODES_STMT = text(BASE_FACTOR_INSERT_BY_CODES_SQL).bindparams(bindparam('codes', expanding=True))
+    
+    _SNAPSHOT_STMT = text(BASE_FACTOR_SNAPSHOT_SQL)
+    
+    # 水位表示该股票从BASE_FACTOR_MIN_DATE起连续填充到的日期：从最早日期开始的窗口建立水位，
+    # 之后只有与水位相接（窗口开始日期不晚于水位次日）的窗口才推进水位，中间有缺口时保持不变
+    _WATERMARK_INIT_STMT = text("INSERT IGNORE INTO base_factor_watermark (code, date) VALUES (:code, :date)")
+    _WATERMARK_ADVANCE_STMT = text("""
+        UPDATE base_factor_watermark SET date = :end_date
+        WHERE code IN :codes AND date >= DATE_SUB(:start_date, INTERVAL 1 DAY) AND date < :end_date
+    """).bindparams(bindparam('codes', expanding=True))
+    _WATERMARK_RANGE_STMT = text(
+        "SELECT COUNT(*), MIN(date) FROM base_factor_watermark WHERE code IN :codes"
+    ).bindparams(bindparam('codes', expanding=True))
+    
+    _SKELETON_UPSERT_STMT = text(BASE_FACTOR_SKELETON_UPSERT_SQL)
+    _GROUP_UPDATE_STMTS = {group: text(sql) for group, sql in BASE_FACTOR_GROUP_UPDATE_SQL.items()}
+    
+    _SUMMARY_STMT = text(BASE_FACTOR_SUMMARY_SQL)
+    _MAX_UPDATED_AT_STMT = text("SELECT MAX(updated_at) FROM dwd_stock_base_factor")
+    
+    # 汇总信息缓存文件及有效期（秒）
+    _summary_cache_path = '.cache/base_factor_summary.json'
+    _summary_cache_ttl = 3600
+    
     def __init__(self):
         self.db_manager = DatabaseManager()
         
@@ -34,224 +272,536 @@ class BaseFactorProcessor:
             'dupont': 'dwd_stock_dupont'
         }
     
-    def create_base_factor_table(self):
-        """创建基础因子表"""
+    @contextmanager
+    def _connection(self, conn: Optional[Connection] = None) -> Iterator[Connection]:
+        """使用调用方传入的连接；未传入时新建一个连接，并在退出时关闭"""
+        if conn is not None:
+            yield conn
+        else:
+            with self.db_manager.engine.connect() as new_conn:
+                yield new_conn
+    
+    def create_base_factor_table(self, conn: Optional[Connection] = None):
+        """
+        创建基础因子表
+        
+        Args:
+            conn: 复用的数据库连接，不传则新建
+        """
         try:
-            with self.db_manager.engine.connect() as conn:
-                # 读取schema文件
-                with open('database/base_factor_schema.sql', 'r', encoding='utf-8') as f:
-                    schema_sql = f.read()
-                
-                # 执行SQL创建表
-                for statement in schema_sql.split(';'):
-                    statement = statement.strip()
-                    if statement:
-                        conn.execute(text(statement))
-                
+            with self._connection(conn) as conn:
+                self.db_manager.execute_sql_file('database/base_factor_schema.sql', conn)
                 conn.commit()
                 logger.info("基础因子表创建完成")
                 
+                self._ensure_dwd_join_indexes(conn)
+                self._ensure_updated_at_index(conn)
+                
         except Exception as e:
             logger.error(f"创建基础因子表失败: {str(e)}")
             raise
     
-    def populate_base_factor_data(self, start_date: str = '2020-06-01', end_date: str = None):
+    def create_base_factor_view(self, conn: Optional[Connection] = None):
+        """
+        创建基础因子视图v_stock_base_factor
+        
+        视图与populate使用同一份SELECT（不带日期条件），查询时实时关联，无需维护物理表
+        
+        Args:
+            conn: 复用的数据库连接，不传则新建
+        """
+        try:
+            with self._connection(conn) as conn:
+                conn.execute(text(BASE_FACTOR_VIEW_SQL))
+                conn.commit()
+                logger.info(f"基础因子视图 {BASE_FACTOR_VIEW} 创建完成")
+        except Exception as e:
+            logger.error(f"创建基础因子视图失败: {str(e)}")
+            raise
+    
+    def refresh_base_factor_snapshot(self, conn: Optional[Connection] = None):
+        """
+        以快照方式整体刷新基础因子表
+        
+        临时表由LIKE创建，继承正式表的主键和索引；一条INSERT ... SELECT写入全部历史后
+        RENAME交换，不经过ON DUPLICATE KEY UPDATE的逐行冲突处理
+        
+        Args:
+            conn: 复用的数据库连接，不传则新建
+        """
+        logger.info("开始刷新基础因子表快照")
+        
+        with self._connection(conn) as conn:
+            self._prepare_stage_table(conn)
+            try:
+                result = conn.execute(self._SNAPSHOT_STMT)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"刷新基础因子表快照失败: {str(e)}")
+                raise
+            
+            self._swap_stage_table(conn)
+        
+        logger.info(f"基础因子表快照刷新完成: {result.rowcount} 条记录")
+    
+    def _ensure_dwd_join_indexes(self, conn):
+        """
+        确保各DWD表存在以(code, date)开头的索引，供基础因子表关联使用
+        
+        dwd_schema.sql中的表以(code, date)为主键（InnoDB聚簇索引），关联时已是按主键直接取行，
+        这里只为缺少该索引的表补建idx_code_date
+        """
+        result = conn.execute(text("""
+            SELECT s1.TABLE_NAME
+            FROM information_schema.STATISTICS s1
+            JOIN information_schema.STATISTICS s2
+              ON s1.TABLE_SCHEMA = s2.TABLE_SCHEMA AND s1.TABLE_NAME = s2.TABLE_NAME
+             AND s1.INDEX_NAME = s2.INDEX_NAME
+            WHERE s1.TABLE_SCHEMA = DATABASE() AND s1.TABLE_NAME IN :tables
+              AND s1.SEQ_IN_INDEX = 1 AND s1.COLUMN_NAME = 'code'
+              AND s2.SEQ_IN_INDEX = 2 AND s2.COLUMN_NAME = 'date'
+        """).bindparams(bindparam('tables', expanding=True)), {'tables': list(self.dwd_tables.values())})
+        indexed_tables = {row[0] for row in result.fetchall()}
+        
+        for table_name in self.dwd_tables.values():
+            if table_name not in indexed_tables:
+                conn.execute(text(f"ALTER TABLE {table_name} ADD INDEX idx_code_date (code, date)"))
+                logger.info(f"已为 {table_name} 添加(code, date)索引")
+        
+        conn.commit()
+    
+    def _ensure_updated_at_index(self, conn):
+        """
+        确保基础因子表存在以updated_at开头的索引
+        
+        get_base_factor_summary以MAX(updated_at)作为缓存键，有该索引时只读索引末端一行，
+        否则每次都要全表扫描；base_factor_schema.sql中已包含，这里为旧表补建
+        """
+        indexed = conn.execute(text("""
+            SELECT 1
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'dwd_stock_base_factor'
+              AND SEQ_IN_INDEX = 1 AND COLUMN_NAME = 'updated_at'
+            LIMIT 1
+        """)).scalar()
+        
+        if not indexed:
+            conn.execute(text("ALTER TABLE dwd_stock_base_factor ADD INDEX idx_updated_at (updated_at)"))
+            conn.commit()
+            logger.info("已为 dwd_stock_base_factor 添加updated_at索引")
+    
+    def populate_base_factor_data(self, start_date: str = '2020-06-01', end_date: str = None,
+                                  mode: str = 'incremental', chunk_days: int = 30,
+                                  incremental_days: Optional[int] = None,
+                                  rebuild_indexes: bool = False,
+                                  max_workers: Optional[int] = None,
+                                  codes_per_task: int = 200,
+                                  fast_load: bool = False,
+                                  resume: bool = False,
+                                  conn: Optional[Connection] = None):
         """
         填充基础因子数据
         
         Args:
             start_date: 开始日期，默认为2020-06-01
             end_date: 结束日期，默认为今天
+            mode: 填充模式
+                - 'full': 全量重建，纯INSERT写入临时表后与正式表交换，
+                  正式表只保留本次日期范围内的数据
+                - 'incremental': 增量更新，使用ON DUPLICATE KEY UPDATE
+            chunk_days: 每批处理的天数，默认为30
+            incremental_days: 增量模式下只更新最近N天，None表示使用start_date
+            rebuild_indexes: 是否在加载前删除二级索引、加载后统一重建
+            max_workers: 并发线程数，默认取Config.DATA_CONFIG['max_workers']，
+                为1时不按股票代码分区
+            codes_per_task: 每个并发任务处理的股票数量
+            fast_load: 是否在加载期间放宽本连接的会话检查（关闭唯一性/外键检查和binlog），
+                只影响本程序的会话，数据可从BaoStock重新生成。
+                innodb_flush_log_at_trx_commit只能全局设置、影响服务器上所有客户端，不在这里修改；
+                需要时由运维在加载前后手动执行 SET GLOBAL innodb_flush_log_at_trx_commit = 2 / 1
+            resume: 增量模式下是否从base_factor_watermark记录的水位之后继续，
+                跳过已连续填充的日期，中断留下的缺口会被补齐
+            conn: 复用的数据库连接，不传则新建；并发任务始终使用各自的连接
         """
+        if mode not in ('full', 'incremental'):
+            raise ValueError(f"不支持的填充模式: {mode}")
+        
         if end_date is None:
-            end_date = datetime.now().strftime('%Y-%m-%d')
+            end_date = date.today().isoformat()
+        
+        if max_workers is None:
+            max_workers = Config.DATA_CONFIG['max_workers']
+        
+        if mode == 'incremental' and incremental_days is not None:
+            window_start = (datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=incremental_days)).strftime('%Y-%m-%d')
+            start_date = max(start_date, window_start)
         
         # 确保开始日期不早于2020-06-01
         if start_date < '2020-06-01':
             start_date = '2020-06-01'
             logger.info(f"开始日期已调整为: {start_date}")
         
-        logger.info(f"开始填充基础因子数据: {start_date} 到 {end_date}")
+        logger.info(f"开始填充基础因子数据({mode}): {start_date} 到 {end_date}")
         
-        try:
-            with self.db_manager.engine.connect() as conn:
-                # 构建复杂的关联SQL
-                sql = f"""
-                INSERT INTO dwd_stock_base_factor (
-                    -- 主键和基础信息
-                    code, date,
-                    
-                    -- K线数据
-                    frequency, open, high, low, close, preclose, volume, amount,
-                    adjustflag, turn, tradestatus, pctChg, peTTM, pbMRQ, psTTM, pcfNcfTTM, isST,
-                    
-                    -- 行业分类数据
-                    code_name, industry, industryClassification,
-                    
-                    -- 利润表数据
-                    roeAvg, npMargin, gpMargin, netProfit, epsTTM, MBRevenue, totalShare, liqaShare,
-                    profit_pubDate, profit_statDate,
-                    
-                    -- 资产负债表数据
-                    currentRatio, quickRatio, cashRatio, YOYLiability, liabilityToAsset, assetToEquity,
-                    balance_pubDate, balance_statDate,
-                    
-                    -- 现金流量表数据
-                    CAToAsset, NCAToAsset, tangibleAssetToAsset, ebitToInterest, CFOToOR, CFOToNP, CFOToGr,
-                    cashflow_pubDate, cashflow_statDate,
-                    
-                    -- 运营能力数据
-                    NRTurnRatio, NRTurnDays, INVTurnRatio, INVTurnDays, CATurnRatio, AssetTurnRatio,
-                    operation_pubDate, operation_statDate,
-                    
-                    -- 成长能力数据
-                    YOYEquity, YOYAsset, YOYNI, YOYEPSBasic, YOYPNI,
-                    growth_pubDate, growth_statDate,
-                    
-                    -- 杜邦分析数据
-                    dupontROE, dupontAssetStoEquity, dupontAssetTurn, dupontPnitoni, dupontNitogr,
-                    dupontTaxBurden, dupontIntburden, dupontEbittogr,
-                    dupont_pubDate, dupont_statDate
-                )
-                SELECT 
-                    -- 主键和基础信息
-                    k.code, k.date,
-                    
-                    -- K线数据
-                    k.frequency, k.open, k.high, k.low, k.close, k.preclose, k.volume, k.amount,
-                    k.adjustflag, k.turn, k.tradestatus, k.pctChg, k.peTTM, k.pbMRQ, k.psTTM, k.pcfNcfTTM, k.isST,
-                    
-                    -- 行业分类数据
-                    i.code_name, i.industry, i.industryClassification,
-                    
-                    -- 利润表数据
-                    p.roeAvg, p.npMargin, p.gpMargin, p.netProfit, p.epsTTM, p.MBRevenue, p.totalShare, p.liqaShare,
-                    p.pubDate, p.statDate,
-                    
-                    -- 资产负债表数据
-                    b.currentRatio, b.quickRatio, b.cashRatio, b.YOYLiability, b.liabilityToAsset, b.assetToEquity,
-                    b.pubDate, b.statDate,
-                    
-                    -- 现金流量表数据
-                    c.CAToAsset, c.NCAToAsset, c.tangibleAssetToAsset, c.ebitToInterest, c.CFOToOR, c.CFOToNP, c.CFOToGr,
-                    c.pubDate, c.statDate,
-                    
-                    -- 运营能力数据
-                    o.NRTurnRatio, o.NRTurnDays, o.INVTurnRatio, o.INVTurnDays, o.CATurnRatio, o.AssetTurnRatio,
-                    o.pubDate, o.statDate,
-                    
-                    -- 成长能力数据
-                    g.YOYEquity, g.YOYAsset, g.YOYNI, g.YOYEPSBasic, g.YOYPNI,
-                    g.pubDate, g.statDate,
-                    
-                    -- 杜邦分析数据
-                    d.dupontROE, d.dupontAssetStoEquity, d.dupontAssetTurn, d.dupontPnitoni, d.dupontNitogr,
-                    d.dupontTaxBurden, d.dupontIntburden, d.dupontEbittogr,
-                    d.pubDate, d.statDate
-                    
-                FROM stock_kline k
-                LEFT JOIN stock_industry i ON k.code = i.code
-                LEFT JOIN dwd_stock_profit p ON k.code = p.code AND k.date = p.date
-                LEFT JOIN dwd_stock_balance b ON k.code = b.code AND k.date = b.date
-                LEFT JOIN dwd_stock_cashflow c ON k.code = c.code AND k.date = c.date
-                LEFT JOIN dwd_stock_operation o ON k.code = o.code AND k.date = o.date
-                LEFT JOIN dwd_stock_growth g ON k.code = g.code AND k.date = g.date
-                LEFT JOIN dwd_stock_dupont d ON k.code = d.code AND k.date = d.date
-                WHERE k.date BETWEEN :start_date AND :end_date
-                ON DUPLICATE KEY UPDATE
-                    -- K线数据更新
-                    frequency = VALUES(frequency), open = VALUES(open), high = VALUES(high), low = VALUES(low),
-                    close = VALUES(close), preclose = VALUES(preclose), volume = VALUES(volume), amount = VALUES(amount),
-                    adjustflag = VALUES(adjustflag), turn = VALUES(turn), tradestatus = VALUES(tradestatus),
-                    pctChg = VALUES(pctChg), peTTM = VALUES(peTTM), pbMRQ = VALUES(pbMRQ), psTTM = VALUES(psTTM),
-                    pcfNcfTTM = VALUES(pcfNcfTTM), isST = VALUES(isST),
-                    
-                    -- 行业分类数据更新
-                    code_name = VALUES(code_name), industry = VALUES(industry), industryClassification = VALUES(industryClassification),
-                    
-                    -- 财务数据更新
-                    roeAvg = VALUES(roeAvg), npMargin = VALUES(npMargin), gpMargin = VALUES(gpMargin),
-                    netProfit = VALUES(netProfit), epsTTM = VALUES(epsTTM), MBRevenue = VALUES(MBRevenue),
-                    totalShare = VALUES(totalShare), liqaShare = VALUES(liqaShare),
-                    profit_pubDate = VALUES(profit_pubDate), profit_statDate = VALUES(profit_statDate),
-                    
-                    currentRatio = VALUES(currentRatio), quickRatio = VALUES(quickRatio), cashRatio = VALUES(cashRatio),
-                    YOYLiability = VALUES(YOYLiability), liabilityToAsset = VALUES(liabilityToAsset), assetToEquity = VALUES(assetToEquity),
-                    balance_pubDate = VALUES(balance_pubDate), balance_statDate = VALUES(balance_statDate),
-                    
-                    CAToAsset = VALUES(CAToAsset), NCAToAsset = VALUES(NCAToAsset), tangibleAssetToAsset = VALUES(tangibleAssetToAsset),
-                    ebitToInterest = VALUES(ebitToInterest), CFOToOR = VALUES(CFOToOR), CFOToNP = VALUES(CFOToNP), CFOToGr = VALUES(CFOToGr),
-                    cashflow_pubDate = VALUES(cashflow_pubDate), cashflow_statDate = VALUES(cashflow_statDate),
-                    
-                    NRTurnRatio = VALUES(NRTurnRatio), NRTurnDays = VALUES(NRTurnDays), INVTurnRatio = VALUES(INVTurnRatio),
-                    INVTurnDays = VALUES(INVTurnDays), CATurnRatio = VALUES(CATurnRatio), AssetTurnRatio = VALUES(AssetTurnRatio),
-                    operation_pubDate = VALUES(operation_pubDate), operation_statDate = VALUES(operation_statDate),
-                    
-                    YOYEquity = VALUES(YOYEquity), YOYAsset = VALUES(YOYAsset), YOYNI = VALUES(YOYNI),
-                    YOYEPSBasic = VALUES(YOYEPSBasic), YOYPNI = VALUES(YOYPNI),
-                    growth_pubDate = VALUES(growth_pubDate), growth_statDate = VALUES(growth_statDate),
-                    
-                    dupontROE = VALUES(dupontROE), dupontAssetStoEquity = VALUES(dupontAssetStoEquity), dupontAssetTurn = VALUES(dupontAssetTurn),
-                    dupontPnitoni = VALUES(dupontPnitoni), dupontNitogr = VALUES(dupontNitogr), dupontTaxBurden = VALUES(dupontTaxBurden),
-                    dupontIntburden = VALUES(dupontIntburden), dupontEbittogr = VALUES(dupontEbittogr),
-                    dupont_pubDate = VALUES(dupont_pubDate), dupont_statDate = VALUES(dupont_statDate),
+        with self._connection(conn) as conn:
+            if mode == 'full':
+                self._prepare_stage_table(conn)
+                target_table = BASE_FACTOR_STAGE_TABLE
+                stmt, codes_stmt = self._INSERT_STMT, self._INSERT_BY_CODES_STMT
+            else:
+                target_table = 'dwd_stock_base_factor'
+                stmt, codes_stmt = self._UPSERT_STMT, self._UPSERT_BY_CODES_STMT
+            
+            # 加载期间在各连接上放宽的会话变量
+            session_vars = []
+            if rebuild_indexes or fast_load:
+                session_vars += ['unique_checks', 'foreign_key_checks']
+            if fast_load:
+                session_vars.append('sql_log_bin')
+            
+            dropped_indexes = []
+            if rebuild_indexes:
+                dropped_indexes = self._drop_secondary_indexes(conn, target_table)
+            
+            # 水位只对正式表有意义，全量模式每次都从空的临时表开始
+            track_watermark = mode == 'incremental'
+            
+            try:
+                if max_workers > 1:
+                    count = self._populate_in_parallel(conn, codes_stmt, start_date, end_date, chunk_days,
+                                                       max_workers, codes_per_task, session_vars,
+                                                       track_watermark, resume)
+                else:
+                    codes = self._fetch_codes(conn, start_date, end_date) if track_watermark else None
+                    if resume and codes:
+                        start_date = self._resume_start_date(conn, codes, start_date)
                     
-                    updated_at = CURRENT_TIMESTAMP
-                """
-                
-                # 执行SQL
-                result = conn.execute(text(sql), {
-                    'start_date': start_date,
-                    'end_date': end_date
+                    self._set_session_vars(conn, session_vars, relaxed=True)
+                    try:
+                        count = self._execute_in_chunks(conn, stmt, start_date, end_date, chunk_days,
+                                                        watermark_codes=codes)
+                    finally:
+                        self._set_session_vars(conn, session_vars, relaxed=False)
+            finally:
+                if rebuild_indexes:
+                    self._add_secondary_indexes(conn, target_table, dropped_indexes)
+            
+            if mode == 'full':
+                self._swap_stage_table(conn)
+        
+        # 直接使用INSERT返回的受影响行数，ON DUPLICATE KEY UPDATE下插入计1、更新计2
+        logger.info(f"成功填充基础因子数据，受影响行数(1=插入,2=更新): {count}")
+    
+    def populate_base_factor_data_by_group(self, start_date: str = '2020-06-01', end_date: str = None,
+                                           chunk_days: int = 30, conn: Optional[Connection] = None):
+        """
+        分组填充基础因子数据
+        
+        先用K线和行业数据写入骨架行，再对每个DWD分组执行一次按主键(code, date)
+        INNER JOIN的UPDATE，把一次7表关联拆成6次单表关联。
+        与populate_base_factor_data不同，DWD中不存在的(code, date)不会被置空，保留原值
+        
+        Args:
+            start_date: 开始日期，默认为2020-06-01
+            end_date: 结束日期，默认为今天
+            chunk_days: 每批处理的天数，默认为30
+            conn: 复用的数据库连接，不传则新建
+        """
+        if end_date is None:
+            end_date = date.today().isoformat()
+        
+        if start_date < '2020-06-01':
+            start_date = '2020-06-01'
+            logger.info(f"开始日期已调整为: {start_date}")
+        
+        logger.info(f"开始分组填充基础因子数据: {start_date} 到 {end_date}")
+        
+        with self._connection(conn) as conn:
+            count = self._execute_in_chunks(conn, self._SKELETON_UPSERT_STMT, start_date, end_date, chunk_days)
+            logger.info(f"骨架行填充完成，受影响行数: {count}")
+            
+            for group, stmt in self._GROUP_UPDATE_STMTS.items():
+                count = self._execute_in_chunks(conn, stmt, start_date, end_date, chunk_days)
+                logger.info(f"{group}分组更新完成，受影响行数: {count}")
+    
+    def _populate_in_parallel(self, conn, stmt: TextClause, start_date: str, end_date: str, chunk_days: int,
+                              max_workers: int, codes_per_task: int, session_vars: List[str],
+                              track_watermark: bool = False, resume: bool = False) -> int:
+        """
+        按股票代码分区并发填充
+        
+        各股票的主键区间互不重叠，不同任务之间不会产生写冲突
+        
+        Returns:
+            受影响的行数
+        """
+        codes = self._fetch_codes(conn, start_date, end_date)
+        code_batches = [codes[i:i + codes_per_task] for i in range(0, len(codes), codes_per_task)]
+        logger.info(f"按股票代码并发填充: {len(codes)} 只股票，{len(code_batches)} 个任务，{max_workers} 个线程")
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._populate_for_codes, batch, stmt, start_date, end_date,
+                                chunk_days, session_vars, track_watermark, resume)
+                for batch in code_batches
+            ]
+            return sum(future.result() for future in as_completed(futures))
+    
+    def _populate_for_codes(self, codes: List[str], stmt: TextClause, start_date: str, end_date: str,
+                            chunk_days: int, session_vars: List[str],
+                            track_watermark: bool = False, resume: bool = False) -> int:
+        """在独立连接上填充一批股票的数据，返回受影响的行数"""
+        with self.db_manager.engine.connect() as conn:
+            if resume:
+                start_date = self._resume_start_date(conn, codes, start_date)
+            
+            self._set_session_vars(conn, session_vars, relaxed=True)
+            try:
+                return self._execute_in_chunks(conn, stmt, start_date, end_date, chunk_days, {'codes': codes},
+                                               watermark_codes=codes if track_watermark else None)
+            finally:
+                self._set_session_vars(conn, session_vars, relaxed=False)
+    
+    def _fetch_codes(self, conn, start_date: str, end_date: str) -> List[str]:
+        """获取日期区间内有K线数据的股票代码"""
+        result = conn.execute(text(
+            "SELECT DISTINCT code FROM stock_kline WHERE date BETWEEN :start_date AND :end_date"
+        ), {'start_date': start_date, 'end_date': end_date})
+        codes = [row[0] for row in result.fetchall()]
+        conn.commit()
+        return codes
+    
+    def _resume_start_date(self, conn, codes: List[str], start_date: str) -> str:
+        """
+        根据填充水位计算续跑的开始日期
+        
+        水位是连续填充到的日期，这批股票都已有水位时从最小水位的次日开始，
+        早于start_date时先补齐中间的缺口；有股票没有水位时仍从start_date开始
+        """
+        watermarked, min_date = conn.execute(self._WATERMARK_RANGE_STMT, {'codes': codes}).fetchone()
+        conn.commit()
+        
+        if watermarked < len(codes) or min_date is None:
+            return start_date
+        
+        resume_date = (min_date + timedelta(days=1)).isoformat()
+        if resume_date < start_date:
+            logger.info(f"从水位续跑: {len(codes)} 只股票只连续填充到 {min_date}，从 {resume_date} 开始补齐")
+        else:
+            logger.info(f"从水位续跑: {len(codes)} 只股票已填充到 {min_date}，从 {resume_date} 开始")
+        return resume_date
+    
+    def _set_session_vars(self, conn, names: List[str], relaxed: bool):
+        """在当前会话中关闭指定的检查开关，或恢复为默认值"""
+        value = '0' if relaxed else 'DEFAULT'
+        for name in names:
+            conn.execute(text(f"SET SESSION {name} = {value}"))
+    
+    def _execute_in_chunks(self, conn, stmt: TextClause, start_date: str, end_date: str, chunk_days: int,
+                           params: Optional[Dict[str, Any]] = None,
+                           watermark_codes: Optional[List[str]] = None) -> int:
+        """
+        按日期窗口分批执行，每个窗口独立提交，降低单事务的undo日志和锁压力
+        
+        Args:
+            watermark_codes: 不为空时，在每个窗口的同一事务中推进这些股票的水位（见_advance_watermark）
+        
+        Returns:
+            各窗口受影响行数之和
+        """
+        affected = 0
+        for chunk_start, chunk_end in _iter_date_chunks(start_date, end_date, chunk_days):
+            try:
+                result = conn.execute(stmt, {
+                    **(params or {}),
+                    'start_date': chunk_start,
+                    'end_date': chunk_end
                 })
-                
+                if watermark_codes:
+                    self._advance_watermark(conn, watermark_codes, chunk_start, chunk_end)
                 conn.commit()
+                affected += result.rowcount
+                logger.info(f"已填充 {chunk_start} 到 {chunk_end}: {result.rowcount} 行受影响")
                 
-                # 获取插入的记录数
-                count_result = conn.execute(text("SELECT COUNT(*) FROM dwd_stock_base_factor"))
-                count = count_result.fetchone()[0]
-                
-                logger.info(f"成功填充基础因子数据: {count} 条记录")
-                
-        except Exception as e:
-            logger.error(f"填充基础因子数据失败: {str(e)}")
-            raise
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"填充基础因子数据失败 ({chunk_start} 到 {chunk_end}): {str(e)}")
+                raise
+        
+        return affected
     
-    def get_base_factor_summary(self) -> Dict[str, Any]:
+    def _advance_watermark(self, conn, codes: List[str], chunk_start: str, chunk_end: str):
         """
-        获取基础因子数据汇总
+        窗口提交前推进水位
+        
+        从最早日期开始的窗口为还没有水位的股票建立水位；已有水位的股票用一条UPDATE推进，
+        只推进与水位相接的股票，跳过的日期不会被记为已填充
+        """
+        if chunk_start <= BASE_FACTOR_MIN_DATE:
+            conn.execute(self._WATERMARK_INIT_STMT, [{'code': code, 'date': chunk_end} for code in codes])
+        conn.execute(self._WATERMARK_ADVANCE_STMT, {'codes': codes, 'start_date': chunk_start, 'end_date': chunk_end})
+    
+    def _drop_secondary_indexes(self, conn, table_name: str) -> List[Tuple[str, List[str]]]:
+        """
+        删除表上的所有非唯一二级索引
         
         Returns:
-            数据汇总信息
+            被删除的索引列表 [(索引名, [列名, ...]), ...]，用于加载后重建
         """
-        summary = {}
+        result = conn.execute(text("""
+            SELECT INDEX_NAME, COLUMN_NAME
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name AND NON_UNIQUE = 1
+            ORDER BY INDEX_NAME, SEQ_IN_INDEX
+        """), {'table_name': table_name})
         
-        with self.db_manager.engine.connect() as conn:
-            # 总记录数
-            result = conn.execute(text("SELECT COUNT(*) FROM dwd_stock_base_factor"))
-            summary['total_records'] = result.fetchone()[0]
+        indexes: Dict[str, List[str]] = {}
+        for index_name, column_name in result.fetchall():
+            indexes.setdefault(index_name, []).append(column_name)
+        
+        for index_name in indexes:
+            conn.execute(text(f"ALTER TABLE {table_name} DROP INDEX {index_name}"))
+        conn.commit()
+        
+        logger.info(f"已删除 {table_name} 的二级索引: {list(indexes)}")
+        return list(indexes.items())
+    
+    def _add_secondary_indexes(self, conn, table_name: str, indexes: List[Tuple[str, List[str]]]):
+        """在一条ALTER语句中重建二级索引，由InnoDB排序后批量构建"""
+        if not indexes:
+            return
+        
+        add_clauses = ', '.join(
+            f"ADD INDEX {index_name} ({', '.join(columns)})" for index_name, columns in indexes
+        )
+        conn.execute(text(f"ALTER TABLE {table_name} {add_clauses}, ALGORITHM=INPLACE"))
+        conn.commit()
+        logger.info(f"已重建 {table_name} 的二级索引: {[name for name, _ in indexes]}")
+    
+    def _ensure_kline_partitioned(self, conn: Optional[Connection] = None):
+        """
+        确保stock_kline按年份做RANGE分区（一次性DDL迁移）
+        
+        分区后按日期窗口查询时MySQL可在计划阶段裁剪分区，只扫描命中的年份
+        
+        Args:
+            conn: 复用的数据库连接，不传则新建
+        """
+        with self._connection(conn) as conn:
+            result = conn.execute(text("""
+                SELECT COUNT(*) FROM information_schema.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'stock_kline'
+                AND PARTITION_NAME IS NOT NULL
+            """))
+            if result.scalar() > 0:
+                logger.info("stock_kline已分区，跳过")
+                return
             
-            # 股票数量
-            result = conn.execute(text("SELECT COUNT(DISTINCT code) FROM dwd_stock_base_factor"))
-            summary['stock_count'] = result.fetchone()[0]
+            result = conn.execute(text("SELECT MIN(YEAR(date)) FROM stock_kline"))
+            first_year = result.scalar() or date.today().year
+            last_year = date.today().year + 1
             
-            # 日期范围
-            result = conn.execute(text("SELECT MIN(date), MAX(date) FROM dwd_stock_base_factor"))
-            min_date, max_date = result.fetchone()
-            summary['date_range'] = {'min': min_date, 'max': max_date}
+            partitions = [
+                f"PARTITION p{year} VALUES LESS THAN ({year + 1})"
+                for year in range(first_year, last_year + 1)
+            ]
+            partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+            
+            logger.info(f"开始对stock_kline按年份分区: {first_year} - {last_year}")
+            conn.execute(text(
+                f"ALTER TABLE stock_kline PARTITION BY RANGE (YEAR(date)) ({', '.join(partitions)})"
+            ))
+            conn.commit()
+            logger.info("stock_kline分区完成")
+    
+    def _prepare_stage_table(self, conn):
+        """创建并清空全量重建使用的临时表"""
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {BASE_FACTOR_STAGE_TABLE} LIKE dwd_stock_base_factor"))
+        conn.execute(text(f"TRUNCATE TABLE {BASE_FACTOR_STAGE_TABLE}"))
+        conn.commit()
+    
+    def _swap_stage_table(self, conn):
+        """原子交换临时表与正式表，并删除旧表"""
+        conn.execute(text("DROP TABLE IF EXISTS dwd_stock_base_factor_old"))
+        conn.execute(text(
+            f"RENAME TABLE dwd_stock_base_factor TO dwd_stock_base_factor_old, "
+            f"{BASE_FACTOR_STAGE_TABLE} TO dwd_stock_base_factor"
+        ))
+        conn.execute(text("DROP TABLE dwd_stock_base_factor_old"))
+        conn.commit()
+        logger.info("基础因子表已切换为全量重建结果")
+    
+    def _load_cached_summary(self, max_updated_at: str) -> Optional[Dict[str, Any]]:
+        """读取汇总缓存，表未更新且未超过TTL时返回缓存内容"""
+        try:
+            with open(self._summary_cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if cached.get('max_updated_at') != max_updated_at:
+            return None
+        if time.time() - cached.get('cached_at', 0) > self._summary_cache_ttl:
+            return None
+        
+        # JSON中日期以字符串保存，还原为date，与重新统计时的返回类型一致
+        summary = cached['summary']
+        summary['date_range'] = {key: date.fromisoformat(value) if value else None
+                                 for key, value in summary['date_range'].items()}
+        
+        logger.info("基础因子表未更新，使用缓存的汇总信息")
+        return summary
+    
+    def _save_cached_summary(self, max_updated_at: str, summary: Dict[str, Any]):
+        """原子写入汇总缓存"""
+        try:
+            os.makedirs(os.path.dirname(self._summary_cache_path), exist_ok=True)
+            tmp_path = f"{self._summary_cache_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'max_updated_at': max_updated_at,
+                    'cached_at': time.time(),
+                    'summary': summary
+                }, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, self._summary_cache_path)
+        except OSError as e:
+            logger.warning(f"写入汇总缓存失败: {str(e)}")
+    
+    def get_base_factor_summary(self, conn: Optional[Connection] = None) -> Dict[str, Any]:
+        """
+        获取基础因子数据汇总
+        
+        以MAX(updated_at)作为缓存键（由idx_updated_at索引直接取得），表未更新时直接返回缓存结果，
+        缓存超过1小时后强制重新统计
+        
+        Args:
+            conn: 复用的数据库连接，不传则新建
+        
+        Returns:
+            数据汇总信息
+        """
+        with self._connection(conn) as conn:
+            max_updated_at = str(conn.execute(self._MAX_UPDATED_AT_STMT).scalar())
             
-            # 各财务数据表的覆盖率
-            for table_type, table_name in self.dwd_tables.items():
-                result = conn.execute(text(f"""
-                    SELECT COUNT(*) FROM dwd_stock_base_factor 
-                    WHERE {table_type}_pubDate IS NOT NULL
-                """))
-                count = result.fetchone()[0]
-                summary[f'{table_type}_coverage'] = count
+            cached = self._load_cached_summary(max_updated_at)
+            if cached is not None:
+                return cached
             
-            # 行业覆盖率
-            result = conn.execute(text("SELECT COUNT(*) FROM dwd_stock_base_factor WHERE industry IS NOT NULL"))
-            summary['industry_coverage'] = result.fetchone()[0]
+            row = conn.execute(self._SUMMARY_STMT).fetchone()
+        
+        summary = {}
+        total_records, stock_count, min_date, max_date, industry_coverage = row[:5]
+        summary['total_records'] = int(total_records or 0)
+        summary['stock_count'] = int(stock_count or 0)
+        summary['date_range'] = {'min': min_date, 'max': max_date}
+        
+        for table_type, count in zip(_DWD_GROUPS, row[5:]):
+            summary[f'{table_type}_coverage'] = int(count or 0)
+        
+        summary['industry_coverage'] = int(industry_coverage or 0)
+        
+        self._save_cached_summary(max_updated_at, summary)
         
         return summary
 
@@ -265,6 +815,16 @@ def main():
     parser.add_argument('--end-date', help='结束日期')
     parser.add_argument('--create-table', action='store_true', help='创建表')
     parser.add_argument('--populate', action='store_true', help='填充数据')
+    parser.add_argument('--mode', choices=['full', 'incremental'], default='incremental', help='填充模式')
+    parser.add_argument('--incremental-days', type=int, help='增量模式下只更新最近N天')
+    parser.add_argument('--rebuild-indexes', action='store_true', help='加载前删除二级索引，加载后重建')
+    parser.add_argument('--max-workers', type=int, help='并发线程数')
+    parser.add_argument('--resume', action='store_true', help='增量模式下从上次的填充水位之后继续')
+    parser.add_argument('--fast-load', action='store_true', help='加载期间在本程序的会话中关闭唯一性/外键检查和binlog以加快写入')
+    parser.add_argument('--by-group', action='store_true', help='先写骨架行，再按DWD分组逐个UPDATE填充')
+    parser.add_argument('--create-view', action='store_true', help='创建实时关联的基础因子视图')
+    parser.add_argument('--refresh-snapshot', action='store_true', help='以快照交换方式整体刷新基础因子表')
+    parser.add_argument('--partition-kline', action='store_true', help='对stock_kline按年份分区（一次性迁移）')
     
     args = parser.parse_args()
     
@@ -276,14 +836,36 @@ def main():
     
     processor = BaseFactorProcessor()
     
-    if args.create_table:
-        processor.create_base_factor_table()
-    
-    if args.populate:
-        processor.populate_base_factor_data(args.start_date, args.end_date)
-    
-    # 显示汇总信息
-    summary = processor.get_base_factor_summary()
+    # 整个命令行流程共用一个连接，避免每个步骤重新握手
+    with processor.db_manager.engine.connect() as conn:
+        if args.create_table:
+            processor.create_base_factor_table(conn=conn)
+        
+        if args.create_view:
+            processor.create_base_factor_view(conn=conn)
+        
+        if args.partition_kline:
+            processor._ensure_kline_partitioned(conn=conn)
+        
+        if args.refresh_snapshot:
+            processor.refresh_base_factor_snapshot(conn=conn)
+        
+        if args.populate and args.by_group:
+            processor.populate_base_factor_data_by_group(args.start_date, args.end_date, conn=conn)
+        elif args.populate:
+            processor.populate_base_factor_data(
+                args.start_date, args.end_date,
+                mode=args.mode,
+                incremental_days=args.incremental_days,
+                rebuild_indexes=args.rebuild_indexes,
+                max_workers=args.max_workers,
+                fast_load=args.fast_load,
+                resume=args.resume,
+                conn=conn
+            )
+        
+        # 显示汇总信息
+        summary = processor.get_base_factor_summary(conn=conn)
     print("\n📊 基础因子数据汇总:")
     print(f"  总记录数: {summary['total_records']:,}")
     print(f"  股票数量: {summary['stock_count']}")
@@ -6,13 +6,16 @@ DWD层财务数据处理模块
 """
 
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if not __package__:
+    # 作为脚本直接运行时把项目根目录加入搜索路径，作为data_processing包导入时不修改sys.path
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database.manager_fixed import DatabaseManagerFixed as DatabaseManager
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,11 +36,16 @@ class DWDProcessor:
             'stock_growth': 'dwd_stock_growth',
             'stock_dupont': 'dwd_stock_dupont'
         }
+        
+        # 表结构运行期间不会变化，列名和据此生成的SQL只构建一次后缓存；
+        # 复用同一个text()对象，SQLAlchemy的编译缓存在每次执行时直接命中
+        self._columns_cache: Dict[str, List[str]] = {}
+        self._sql_cache: Dict[tuple, Any] = {}
     
     
     def get_table_columns(self, table_name: str) -> List[str]:
         """
-        获取表的所有列名
+        获取表的所有列名，结果按表名缓存
         
         Args:
             table_name: 表名
@@ -45,79 +53,141 @@ class DWDProcessor:
         Returns:
             列名列表
         """
-        with self.db_manager.engine.connect() as conn:
-            result = conn.execute(text(f"DESCRIBE {table_name}"))
-            columns = [row[0] for row in result.fetchall()]
-            return columns
+        columns = self._columns_cache.get(table_name)
+        if columns is None:
+            with self.db_manager.engine.connect() as conn:
+                result = conn.execute(text(f"DESCRIBE {table_name}"))
+                columns = [row[0] for row in result.fetchall()]
+            self._columns_cache[table_name] = columns
+        return list(columns)
+    
+    def invalidate_columns_cache(self, table_name: Optional[str] = None):
+        """
+        清除列名缓存及依赖它生成的SQL，表结构变更后调用
+        
+        Args:
+            table_name: 表名，None表示清除所有表
+        """
+        if table_name is None:
+            self._columns_cache.clear()
+            self._sql_cache.clear()
+        else:
+            self._columns_cache.pop(table_name, None)
+            for cache_key in [key for key in self._sql_cache if table_name in key]:
+                del self._sql_cache[cache_key]
+    
+    def _get_load_sql(self, source_table: str, target_table: str):
+        """
+        获取把源表展开为截面数据的INSERT语句，按 (源表, 目标表) 生成一次后缓存
+        
+        Args:
+            source_table: 源表名
+            target_table: 目标表名
+            
+        Returns:
+            以:start_date、:end_date及:codes（股票代码列表，expanding方式绑定）为参数的text()语句
+        """
+        cache_key = (source_table, target_table)
+        stmt = self._sql_cache.get(cache_key)
+        if stmt is not None:
+            return stmt
+        
+        # 获取源表的列名
+        source_columns = self.get_table_columns(source_table)
+        
+        # 构建财务指标字段列表（排除系统字段）
+        exclude_fields = ['code', 'pubDate', 'statDate', 'created_at', 'updated_at']
+        financial_fields = [col for col in source_columns if col not in exclude_fields]
+        
+        # 构建INSERT字段列表
+        insert_fields = ['code', 'date'] + financial_fields + ['pubDate', 'statDate']
+        insert_fields_str = ', '.join(insert_fields)
+        
+        # 构建VALUES字段列表
+        values_fields = ['f.code', 't.calendar_date'] + [f'f.{col}' for col in financial_fields] + ['f.pubDate', 'f.statDate']
+        values_fields_str = ', '.join(values_fields)
+        
+        # 使用SQL直接生成截面数据
+        # 每条财务数据的有效区间为 (pubDate, 同一股票下一个更晚的pubDate)，
+        # 用窗口函数一次算出下一个发布日期，代替逐行执行的相关子查询；
+        # 帧从1天之后开始，同一天发布的多条数据取的是更晚一天的发布日期，与LEAD()不同
+        sql = f"""
+        INSERT INTO {target_table} ({insert_fields_str})
+        SELECT {values_fields_str}
+        FROM (
+            SELECT s.*,
+                   MIN(s.pubDate) OVER (
+                       PARTITION BY s.code ORDER BY s.pubDate
+                       RANGE BETWEEN INTERVAL 1 DAY FOLLOWING AND UNBOUNDED FOLLOWING
+                   ) AS next_pubDate
+            FROM {source_table} s
+            WHERE s.pubDate IS NOT NULL
+            AND s.code IN :codes
+        ) f
+        JOIN trade_dates t
+          ON t.calendar_date > f.pubDate
+         AND t.calendar_date < COALESCE(f.next_pubDate, :end_date)
+        WHERE t.calendar_date BETWEEN :start_date AND :end_date
+        AND t.is_trading_day = 1
+        AND f.pubDate < :end_date
+        ON DUPLICATE KEY UPDATE
+        {', '.join([f'{col} = VALUES({col})' for col in financial_fields])},
+        pubDate = VALUES(pubDate),
+        statDate = VALUES(statDate),
+        updated_at = CURRENT_TIMESTAMP
+        """
+        
+        stmt = text(sql).bindparams(bindparam('codes', expanding=True))
+        self._sql_cache[cache_key] = stmt
+        return stmt
+    
+    def _get_codes_sql(self, source_table: str):
+        """获取查询源表中有发布日期的股票代码的语句，按源表缓存"""
+        cache_key = ('codes', source_table)
+        stmt = self._sql_cache.get(cache_key)
+        if stmt is None:
+            stmt = text(f"SELECT DISTINCT code FROM {source_table} WHERE pubDate IS NOT NULL ORDER BY code")
+            self._sql_cache[cache_key] = stmt
+        return stmt
     
-    def process_financial_table_with_sql(self, source_table: str, target_table: str, start_date: str, end_date: str):
+    def process_financial_table_with_sql(self, source_table: str, target_table: str, start_date: str, end_date: str,
+                                         codes_per_chunk: int = 200):
         """
         使用SQL直接处理财务数据表，生成截面数据
         
+        按股票代码分块执行并逐块提交，每个事务只包含一部分股票的数据，
+        避免整张表展开后的数据放在一个事务里导致undo日志过大；中途失败时已提交的块保留
+        
         Args:
             source_table: 源表名
             target_table: 目标表名
             start_date: 开始日期
             end_date: 结束日期
+            codes_per_chunk: 每个事务处理的股票数量
         """
         logger.info(f"开始使用SQL处理 {source_table} -> {target_table}")
         
         try:
+            stmt = self._get_load_sql(source_table, target_table)
+            
             with self.db_manager.engine.connect() as conn:
-                # 获取源表的列名
-                source_columns = self.get_table_columns(source_table)
-                
-                # 构建财务指标字段列表（排除系统字段）
-                exclude_fields = ['code', 'pubDate', 'statDate', 'created_at', 'updated_at']
-                financial_fields = [col for col in source_columns if col not in exclude_fields]
-                financial_fields_str = ', '.join([f'f.{col}' for col in financial_fields])
+                result = conn.execute(self._get_codes_sql(source_table))
+                codes = [row[0] for row in result.fetchall()]
                 
-                # 构建INSERT字段列表
-                insert_fields = ['code', 'date'] + financial_fields + ['pubDate', 'statDate']
-                insert_fields_str = ', '.join(insert_fields)
+                affected = 0
+                for i in range(0, len(codes), codes_per_chunk):
+                    # 执行SQL
+                    result = conn.execute(stmt, {
+                        'start_date': start_date,
+                        'end_date': end_date,
+                        'codes': codes[i:i + codes_per_chunk]
+                    })
+                    conn.commit()
+                    affected += result.rowcount
                 
-                # 构建VALUES字段列表
-                values_fields = ['f.code', 't.calendar_date'] + [f'f.{col}' for col in financial_fields] + ['f.pubDate', 'f.statDate']
-                values_fields_str = ', '.join(values_fields)
-                
-                # 使用SQL直接生成截面数据
-                sql = f"""
-                INSERT INTO {target_table} ({insert_fields_str})
-                SELECT {values_fields_str}
-                FROM {source_table} f
-                CROSS JOIN trade_dates t
-                WHERE t.calendar_date BETWEEN :start_date AND :end_date
-                AND t.is_trading_day = 1
-                AND f.pubDate IS NOT NULL
-                AND t.calendar_date > f.pubDate
-                AND (
-                    t.calendar_date < (
-                        SELECT COALESCE(MIN(f2.pubDate), :end_date)
-                        FROM {source_table} f2
-                        WHERE f2.code = f.code
-                        AND f2.pubDate > f.pubDate
-                    )
-                )
-                ON DUPLICATE KEY UPDATE
-                {', '.join([f'{col} = VALUES({col})' for col in financial_fields])},
-                pubDate = VALUES(pubDate),
-                statDate = VALUES(statDate),
-                updated_at = CURRENT_TIMESTAMP
-                """
-                
-                # 执行SQL
-                result = conn.execute(text(sql), {
-                    'start_date': start_date,
-                    'end_date': end_date
-                })
-                
-                conn.commit()
-                
-                # 获取插入的记录数
-                count_result = conn.execute(text(f"SELECT COUNT(*) FROM {target_table}"))
-                count = count_result.fetchone()[0]
-                
-                logger.info(f"成功处理 {source_table} -> {target_table}: {count} 条记录")
+                # 直接使用语句的影响行数，不再对目标表做全表COUNT(*)
+                # ON DUPLICATE KEY UPDATE中新插入的行计1，值有变化的更新行计2
+                logger.info(f"成功处理 {source_table} -> {target_table}: {len(codes)} 只股票，影响 {affected} 行")
                 
         except Exception as e:
             logger.error(f"处理 {source_table} 失败: {str(e)}")
@@ -136,29 +206,41 @@ class DWDProcessor:
         # 使用SQL方法处理
         self.process_financial_table_with_sql(source_table, target_table, start_date, end_date)
     
-    def process_all_financial_tables(self, start_date: str = '2020-01-01', end_date: str = None):
+    def process_all_financial_tables(self, start_date: str = '2020-01-01', end_date: str = None,
+                                     max_workers: Optional[int] = None):
         """
         处理所有财务数据表
         
+        各表的处理互不依赖，且主要耗时在MySQL端，因此并发执行，每个线程使用连接池中的独立连接
+        
         Args:
             start_date: 开始日期
             end_date: 结束日期，默认为今天
+            max_workers: 并发处理的表数，默认为 min(表数量, CPU核数)
         """
         if end_date is None:
-            end_date = datetime.now().strftime('%Y-%m-%d')
+            end_date = date.today().isoformat()
         
         logger.info(f"开始处理所有财务数据表: {start_date} 到 {end_date}")
         
         # 创建DWD表
         self.create_dwd_tables()
         
-        # 处理每个财务数据表
-        for source_table, target_table in self.financial_tables.items():
-            try:
-                self.process_financial_table(source_table, target_table, start_date, end_date)
-            except Exception as e:
-                logger.error(f"处理 {source_table} 失败: {str(e)}")
-                continue
+        if max_workers is None:
+            max_workers = min(len(self.financial_tables), os.cpu_count() or 1)
+        self.db_manager.ensure_pool_size(max_workers)
+        
+        # 并发处理每个财务数据表，单表失败不影响其他表
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_table = {
+                executor.submit(self.process_financial_table, source_table, target_table, start_date, end_date): source_table
+                for source_table, target_table in self.financial_tables.items()
+            }
+            for future in as_completed(future_to_table):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"处理 {future_to_table[future]} 失败: {str(e)}")
         
         logger.info("所有财务数据表处理完成")
     
@@ -166,41 +248,74 @@ class DWDProcessor:
         """创建DWD表"""
         try:
             with self.db_manager.engine.connect() as conn:
-                # 读取DWD schema文件
-                with open('database/dwd_schema.sql', 'r', encoding='utf-8') as f:
-                    schema_sql = f.read()
-                
-                # 执行SQL创建表
-                for statement in schema_sql.split(';'):
-                    statement = statement.strip()
-                    if statement:
-                        conn.execute(text(statement))
-                
+                self.db_manager.execute_sql_file('database/dwd_schema.sql', conn)
                 conn.commit()
                 logger.info("DWD表创建完成")
                 
+                self._ensure_source_pub_indexes(conn)
+                
         except Exception as e:
             logger.error(f"创建DWD表失败: {str(e)}")
             raise
     
-    def get_dwd_data_summary(self) -> Dict[str, int]:
+    def _ensure_source_pub_indexes(self, conn):
+        """
+        确保各财务数据源表存在以(code, pubDate)开头的索引
+        
+        展开截面数据时按股票代码分块读取源表，并在每只股票内按pubDate排序计算下一个发布日期，
+        该索引使读取成为按代码的范围扫描且无需额外排序；schema.sql中已包含，这里为旧表补建
+        """
+        result = conn.execute(text("""
+            SELECT s1.TABLE_NAME
+            FROM information_schema.STATISTICS s1
+            JOIN information_schema.STATISTICS s2
+              ON s1.TABLE_SCHEMA = s2.TABLE_SCHEMA AND s1.TABLE_NAME = s2.TABLE_NAME
+             AND s1.INDEX_NAME = s2.INDEX_NAME
+            WHERE s1.TABLE_SCHEMA = DATABASE() AND s1.TABLE_NAME IN :tables
+              AND s1.SEQ_IN_INDEX = 1 AND s1.COLUMN_NAME = 'code'
+              AND s2.SEQ_IN_INDEX = 2 AND s2.COLUMN_NAME = 'pubDate'
+        """).bindparams(bindparam('tables', expanding=True)), {'tables': list(self.financial_tables)})
+        indexed_tables = {row[0] for row in result.fetchall()}
+        
+        for source_table in self.financial_tables:
+            if source_table not in indexed_tables:
+                conn.execute(text(f"ALTER TABLE {source_table} ADD INDEX idx_code_pub_date (code, pubDate)"))
+                logger.info(f"已为 {source_table} 添加(code, pubDate)索引")
+        
+        conn.commit()
+    
+    def get_dwd_data_summary(self, exact: bool = False) -> Dict[str, int]:
         """
         获取DWD数据汇总
         
+        Args:
+            exact: 是否返回精确记录数。默认一次查询information_schema中InnoDB估算的行数，
+                   为True时用一条UNION ALL语句对各表执行COUNT(*)
+        
         Returns:
-            各DWD表的记录数
+            各DWD表的记录数，表不存在或查询失败时为0
         """
-        summary = {}
+        target_tables = list(self.financial_tables.values())
+        summary = {target_table: 0 for target_table in target_tables}
         
-        with self.db_manager.engine.connect() as conn:
-            for target_table in self.financial_tables.values():
-                try:
-                    result = conn.execute(text(f"SELECT COUNT(*) FROM {target_table}"))
-                    count = result.fetchone()[0]
-                    summary[target_table] = count
-                except Exception as e:
-                    logger.warning(f"获取 {target_table} 记录数失败: {str(e)}")
-                    summary[target_table] = 0
+        try:
+            with self.db_manager.engine.connect() as conn:
+                if exact:
+                    result = conn.execute(text(" UNION ALL ".join(
+                        f"SELECT '{target_table}', COUNT(*) FROM {target_table}" for target_table in target_tables
+                    )))
+                else:
+                    result = conn.execute(text("""
+                        SELECT table_name, table_rows
+                        FROM information_schema.tables
+                        WHERE table_schema = DATABASE()
+                        AND table_name IN :tables
+                    """).bindparams(bindparam('tables', expanding=True)), {'tables': target_tables})
+                
+                for table_name, count in result.fetchall():
+                    summary[table_name] = int(count or 0)
+        except Exception as e:
+            logger.warning(f"获取DWD表记录数失败: {str(e)}")
         
         return summary
 
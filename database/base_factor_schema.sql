@@ -104,5 +104,15 @@ CREATE TABLE IF NOT EXISTS dwd_stock_base_factor (
     INDEX idx_industry (industry),
     INDEX idx_pe (peTTM),
     INDEX idx_pb (pbMRQ),
-    INDEX idx_roe (roeAvg)
+    INDEX idx_roe (roeAvg),
+    INDEX idx_updated_at (updated_at)  -- 汇总缓存键MAX(updated_at)直接读索引末端
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='DWD层基础因子表';
+
+-- 基础因子表填充水位：记录每只股票从最早日期(2020-06-01)起连续填充到的日期，用于失败后断点续跑
+CREATE TABLE IF NOT EXISTS base_factor_watermark (
+    code VARCHAR(20) NOT NULL COMMENT '股票代码',
+    date DATE NOT NULL COMMENT '连续填充到的日期（含）',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    
+    PRIMARY KEY (code)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='基础因子表填充水位';
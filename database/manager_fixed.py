@@ -7,43 +7,82 @@
 
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any, Optional
-from sqlalchemy import create_engine, text
-import pymysql
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import lru_cache
+from datetime import date
+from typing import List, Dict, Any, Optional, Iterator, Union
+from sqlalchemy import create_engine, text, bindparam, MetaData, Table
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+import sqlparse
 import logging
 
+from config import Config
+
+# mysqlclient(MySQLdb)是C扩展驱动，executemany等参数处理比纯Python的pymysql快数倍，安装后优先使用
+try:
+    import MySQLdb
+    MYSQLDB_AVAILABLE = True
+except ImportError:
+    MYSQLDB_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# 原始表结构文件
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+
+# 按字段名识别数值字段的关键字（小写）
+NUMERIC_KEYWORDS = ('rate', 'ratio', 'amount', 'price', 'profit', 'revenue', 'share', 'asset', 'liability',
+                    'equity', 'margin', 'eps', 'roe', 'turn', 'pct', 'pe', 'pb', 'ps', 'pcf')
+
+# 字段名中不含date、但需按日期字段处理的字段
+DATE_EXTRA_COLUMNS = frozenset({'ipoDate', 'outDate', 'pubDate', 'statDate'})
+
+
+@lru_cache(maxsize=256)
+def _classify_columns(columns: tuple) -> tuple:
+    """
+    按字段名对字段分类，相同字段组合只计算一次
+    
+    Returns:
+        (日期字段集合, 数值字段列表)
+    """
+    cols_lower = {col: col.lower() for col in columns}
+    date_columns = frozenset(col for col, lower in cols_lower.items() if 'date' in lower) | (DATE_EXTRA_COLUMNS & set(columns))
+    numeric_columns = [col for col, lower in cols_lower.items()
+                       if col not in date_columns and any(keyword in lower for keyword in NUMERIC_KEYWORDS)]
+    return date_columns, numeric_columns
+
 
 class DatabaseManagerFixed:
     """修复版数据库管理器"""
     
-    def __init__(self):
+    def __init__(self, pool_size: Optional[int] = None):
+        """
+        Args:
+            pool_size: 连接池大小，默认取Config.POOL_CONFIG['pool_size']（环境变量DB_POOL_SIZE）
+        """
         self.engine = None
-        self.connection = None
-        self.cursor = None
+        self.pool_size = pool_size if pool_size is not None else Config.POOL_CONFIG['pool_size']
+        # {(表名, 字段, 主键): UPSERT语句}，同一表结构只拼接一次SQL
+        self._upsert_sql_cache: Dict[tuple, str] = {}
+        # {表名: 反射得到的Table}、{(表名, 字段, 主键): UPSERT语句}，供upsert_data复用
+        self._table_cache: Dict[str, Table] = {}
+        self._upsert_stmt_cache: Dict[tuple, Any] = {}
+        # {(表名, 字段, 主键): 为该表结构生成的写入函数}，见_get_upserter
+        self._upserters: Dict[tuple, Any] = {}
         self._connect()
     
     def _connect(self):
         """连接数据库"""
         try:
-            # 数据库配置
-            config = {
-                'host': 'localhost',
-                'port': 3306,
-                'user': 'root',
-                'password': 'root',
-                'database': 'baostock',
-                'charset': 'utf8mb4'
-            }
-            
-            # 创建SQLAlchemy引擎
-            connection_string = f"mysql+pymysql://{config['user']}:{config['password']}@{config['host']}:{config['port']}/{config['database']}?charset={config['charset']}"
-            self.engine = create_engine(connection_string, pool_pre_ping=True, pool_recycle=3600)
-            
-            # 创建PyMySQL连接
-            self.connection = pymysql.connect(**config)
-            self.cursor = self.connection.cursor()
+            # 创建SQLAlchemy引擎，连接参数统一取自Config.DATABASE_CONFIG
+            driver = 'mysqldb' if MYSQLDB_AVAILABLE else 'pymysql'
+            self._connection_string = Config.get_database_url(driver)
+            self.engine = self._create_engine(self.pool_size)
             
             logger.info("数据库连接成功")
             
@@ -51,6 +90,36 @@ class DatabaseManagerFixed:
             logger.error(f"数据库连接失败: {str(e)}")
             raise
     
+    def _create_engine(self, pool_size: int):
+        """创建连接池大小为pool_size的SQLAlchemy引擎，溢出连接数和等待超时取Config.POOL_CONFIG"""
+        return create_engine(
+            self._connection_string,
+            pool_pre_ping=True,
+            pool_recycle=3600,
+            pool_use_lifo=True,  # 优先复用最近归还的连接，空闲连接少时不必逐个轮换
+            pool_size=pool_size,
+            max_overflow=Config.POOL_CONFIG['max_overflow'],
+            pool_timeout=Config.POOL_CONFIG['pool_timeout']
+        )
+    
+    def ensure_pool_size(self, pool_size: int):
+        """
+        确保连接池能同时提供pool_size个连接，使每个工作线程都有独立的连接
+        
+        连接池不足时重建引擎，旧引擎上已借出的连接归还后关闭
+        
+        Args:
+            pool_size: 需要的连接数，一般为并发写库的线程数
+        """
+        if pool_size <= self.pool_size:
+            return
+        
+        old_engine = self.engine
+        self.engine = self._create_engine(pool_size)
+        self.pool_size = pool_size
+        old_engine.dispose()
+        logger.info(f"数据库连接池已扩大到 {pool_size}")
+    
     def _process_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         处理DataFrame，转换数据类型
@@ -61,41 +130,31 @@ class DatabaseManagerFixed:
         Returns:
             处理后的DataFrame
         """
-        df = df.copy()
-        
-        # 处理日期类型
-        date_columns = [col for col in df.columns if 'date' in col.lower() or col in ['ipoDate', 'outDate', 'pubDate', 'statDate']]
-        for col in date_columns:
-            if col in df.columns:
-                # 处理空字符串日期字段
-                df[col] = df[col].replace('', None)
-        
-        # 处理数值类型（排除日期字段）
-        numeric_columns = [col for col in df.columns if any(keyword in col.lower() for keyword in ['rate', 'ratio', 'amount', 'price', 'profit', 'revenue', 'share', 'asset', 'liability', 'equity', 'margin', 'eps', 'roe', 'turn', 'pct', 'pe', 'pb', 'ps', 'pcf']) and 'date' not in col.lower()]
-        for col in numeric_columns:
-            if col in df.columns:
-                # 先处理空字符串
-                df[col] = df[col].replace('', None)
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # 处理空值（排除日期字段）
-        non_date_columns = [col for col in df.columns if 'date' not in col.lower() and col not in ['ipoDate', 'outDate', 'pubDate', 'statDate']]
-        for col in non_date_columns:
-            if col in df.columns:
-                df[col] = df[col].replace('', None)
-                df[col] = df[col].replace('nan', None)
-                df[col] = df[col].where(pd.notnull(df[col]), None)
-        
-        return df
+        # 按字段名识别数值字段，日期字段不做数值转换
+        _, numeric_columns = _classify_columns(tuple(df.columns))
+        
+        # 空字符串和'nan'整体替换为空值，返回新的DataFrame，不修改调用方的数据
+        df = df.replace({'': np.nan, 'nan': np.nan})
+        
+        if numeric_columns:
+            df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
+        
+        # 空值统一为None
+        return df.astype(object).where(df.notna(), None)
     
-    def upsert_data_safe(self, table_name: str, data: List[Dict], primary_keys: List[str]):
+    def upsert_data_safe(self, table_name: str, data: List[Dict], primary_keys: List[str],
+                         max_workers: int = 8):
         """
         安全的数据插入/更新方法
         
+        各批次主键互不重叠，由线程池并发写入，每个线程从连接池取独立的连接；
+        pymysql在网络I/O时释放GIL，并发写入可充分利用数据库的写入能力
+        
         Args:
             table_name: 表名
             data: 数据列表
             primary_keys: 主键字段列表
+            max_workers: 并发写入的线程数
         """
         if not data:
             return
@@ -105,36 +164,37 @@ class DatabaseManagerFixed:
             df = pd.DataFrame(data)
             df = self._process_dataframe(df)
             
-            # 处理NaN值
-            df = df.replace([np.inf, -np.inf], np.nan)
-            # 使用where方法替换NaN值
-            df = df.where(pd.notnull(df), None)
-            
-            # 添加时间戳
-            df['created_at'] = pd.Timestamp.now()
-            df['updated_at'] = pd.Timestamp.now()
-            
-            # 去重处理
-            df = df.drop_duplicates(subset=primary_keys, keep='last')
+            # 按主键去重，保留最后一条；用字典记录每个主键最后出现的位置，避免对object列排序分组
+            seen = {}
+            for i, key in enumerate(zip(*[df[k].to_numpy() for k in primary_keys])):
+                seen[key] = i
+            if len(seen) < len(df):
+                df = df.iloc[list(seen.values())]
             
             # 使用更小的批次大小
             batch_size = 100
             total_processed = 0
+            batches = [df.iloc[i:i + batch_size] for i in range(0, len(df), batch_size)]
             
-            for i in range(0, len(df), batch_size):
-                batch_df = df.iloc[i:i+batch_size].copy()
+            if len(batches) == 1:
+                total_processed = self._upsert_chunk(table_name, batches[0], primary_keys, 1)
+            else:
+                max_workers = min(max_workers, len(batches))
+                # 每个线程独占一个连接，另留余量给其他调用方
+                self.ensure_pool_size(max_workers + 2)
                 
-                try:
-                    # 使用INSERT IGNORE避免重复键错误
-                    self._insert_batch_ignore(table_name, batch_df)
-                    total_processed += len(batch_df)
-                    logger.info(f"已处理 {total_processed}/{len(df)} 条记录")
-                    
-                except Exception as batch_error:
-                    logger.warning(f"批次 {i//batch_size + 1} 处理失败: {str(batch_error)}")
-                    # 尝试逐条插入
-                    self._insert_records_one_by_one(table_name, batch_df)
-                    total_processed += len(batch_df)
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = [executor.submit(self._upsert_chunk, table_name, batch_df, primary_keys, n)
+                               for n, batch_df in enumerate(batches, 1)]
+                    try:
+                        for future in as_completed(futures):
+                            total_processed += future.result()
+                            logger.info(f"已处理 {total_processed}/{len(df)} 条记录")
+                    except Exception:
+                        # 首个失败立即返回，尚未开始的批次不再写入
+                        for future in futures:
+                            future.cancel()
+                        raise
             
             logger.info(f"成功处理 {total_processed} 条记录到表 {table_name}")
             
@@ -142,62 +202,421 @@ class DatabaseManagerFixed:
             logger.error(f"处理数据到表 {table_name} 失败: {str(e)}")
             raise
     
-    def _insert_batch_ignore(self, table_name: str, df: pd.DataFrame):
-        """批量插入记录，使用INSERT IGNORE"""
-        if len(df) == 0:
-            return
+    def upsert_data(self, table_name: str, data: List[Dict], primary_keys: List[str],
+                    chunk_size: int = 1000) -> int:
+        """
+        插入/更新数据
+        
+        使用SQLAlchemy Core的mysql insert().on_duplicate_key_update()，语句按(表, 字段, 主键)
+        只构建一次，编译结果由SQLAlchemy缓存复用；不逐行查询记录是否存在，所有批次在同一事务中写入
+        
+        Args:
+            table_name: 表名
+            data: 数据列表，各行字段相同
+            primary_keys: 主键字段列表
+            chunk_size: 每批行数
+            
+        Returns:
+            写入的行数
+        """
+        if not data:
+            return 0
+        
+        columns = tuple(sorted(data[0]))
+        stmt = self._get_upsert_stmt(table_name, columns, tuple(primary_keys))
+        
+        # BaoStock以空字符串表示缺失值
+        rows = [{col: None if row.get(col) == '' else row.get(col) for col in columns} for row in data]
+        
+        try:
+            with self.engine.begin() as conn:
+                for i in range(0, len(rows), chunk_size):
+                    conn.execute(stmt, rows[i:i + chunk_size])
+            
+            logger.info(f"成功写入 {len(rows)} 条记录到表 {table_name}")
+            return len(rows)
+            
+        except Exception as e:
+            logger.error(f"写入表 {table_name} 失败: {str(e)}")
+            raise
+    
+    def _get_table(self, table_name: str) -> Table:
+        """反射表结构，每张表只反射一次"""
+        table = self._table_cache.get(table_name)
+        if table is None:
+            table = Table(table_name, MetaData(), autoload_with=self.engine)
+            self._table_cache[table_name] = table
+        return table
+    
+    def _get_upsert_stmt(self, table_name: str, columns: tuple, primary_keys: tuple):
+        """获取(表, 字段, 主键)对应的INSERT ... ON DUPLICATE KEY UPDATE语句，首次使用时构建并缓存"""
+        key = (table_name, columns, primary_keys)
+        stmt = self._upsert_stmt_cache.get(key)
+        if stmt is not None:
+            return stmt
+        
+        table = self._get_table(table_name)
+        stmt = mysql_insert(table)
+        # 只更新本次写入的字段，created_at只在插入时写入
+        updates = {col: stmt.inserted[col] for col in columns
+                   if col in table.c and col not in primary_keys and col != 'created_at'}
+        stmt = stmt.on_duplicate_key_update(updates) if updates else stmt.prefix_with('IGNORE')
+        
+        self._upsert_stmt_cache[key] = stmt
+        return stmt
+    
+    @contextmanager
+    def _transaction(self, conn=None):
+        """使用调用方传入的连接（由调用方提交），未传入时新开一个事务"""
+        if conn is not None:
+            yield conn
+        else:
+            with self.engine.begin() as new_conn:
+                yield new_conn
+    
+    def bulk_upsert(self, table_name: str, data: List[Dict], primary_keys: List[str],
+                    batch_size: int = 1000, conn=None) -> int:
+        """
+        批量插入/更新数据，使用INSERT ... ON DUPLICATE KEY UPDATE
+        
+        通过连接池获取连接，可在多个线程中并发调用；pymysql的executemany会把
+        一批行合并为一条多值INSERT发送
+        
+        Args:
+            table_name: 表名
+            data: 数据列表，各行字段相同
+            primary_keys: 主键字段列表
+            batch_size: 每批行数，按MySQL占位符上限(65535)自动收缩
+            conn: 在调用方的事务中执行，不传则单独开启事务
+            
+        Returns:
+            写入的行数
+        """
+        if not data:
+            return 0
+        
+        # 字段按名称排序，字段相同但字典顺序不同的数据也能复用同一个写入函数
+        columns = tuple(sorted(data[0]))
+        upserter = self._get_upserter(table_name, columns, tuple(primary_keys))
+        
+        batch_size = min(batch_size, 65535 // len(columns))
+        
+        try:
+            with self._transaction(conn) as conn:
+                count = upserter(conn, data, batch_size)
+            
+            logger.info(f"成功写入 {count} 条记录到表 {table_name}")
+            return count
+            
+        except Exception as e:
+            logger.error(f"批量写入表 {table_name} 失败: {str(e)}")
+            raise
+    
+    def copy_upsert(self, table_name: str, columns: Dict[str, list], primary_keys: List[str],
+                    conn=None) -> int:
+        """
+        以列式数据批量插入/更新，适合大批量写入
+        
+        数据先用LOAD DATA LOCAL INFILE载入临时表，再用一条
+        INSERT ... SELECT ... ON DUPLICATE KEY UPDATE合并到目标表，避免逐行解析VALUES。
+        临时表用CREATE ... SELECT ... LIMIT 0按写入字段的类型创建，不复制分区定义
+        （MySQL不允许分区的临时表，CREATE ... LIKE分区表会失败）
+        
+        Args:
+            table_name: 表名
+            columns: 列式数据 {字段名: [值, ...]}，各列长度相同
+            primary_keys: 主键字段列表
+            conn: 在调用方的事务中执行，不传则单独开启事务
+            
+        Returns:
+            写入的行数
+        """
+        df = pd.DataFrame(columns)
+        if df.empty:
+            return 0
+        
+        tmp_table = f'tmp_{table_name}'
+        columns_str = ', '.join(f'`{col}`' for col in df.columns)
+        updates = ', '.join(f'`{col}` = VALUES(`{col}`)' for col in df.columns
+                            if col not in primary_keys and col != 'created_at')
+        if updates:
+            merge_sql = (f"INSERT INTO `{table_name}` ({columns_str}) SELECT {columns_str} FROM `{tmp_table}` "
+                         f"ON DUPLICATE KEY UPDATE {updates}")
+        else:
+            merge_sql = f"INSERT IGNORE INTO `{table_name}` ({columns_str}) SELECT {columns_str} FROM `{tmp_table}`"
+        
+        try:
+            with self._transaction(conn) as conn:
+                conn.exec_driver_sql(f"CREATE TEMPORARY TABLE `{tmp_table}` "
+                                     f"SELECT {columns_str} FROM `{table_name}` LIMIT 0")
+                try:
+                    self._load_data(conn, tmp_table, df)
+                    conn.exec_driver_sql(merge_sql)
+                finally:
+                    conn.exec_driver_sql(f"DROP TEMPORARY TABLE IF EXISTS `{tmp_table}`")
+            
+            logger.info(f"成功写入 {len(df)} 条记录到表 {table_name}")
+            return len(df)
+            
+        except Exception as e:
+            logger.error(f"批量写入表 {table_name} 失败: {str(e)}")
+            raise
+    
+    def _load_data(self, conn, table_name: str, df: pd.DataFrame):
+        """
+        把DataFrame写为临时文件，用LOAD DATA LOCAL INFILE载入表中
+        
+        pymysql只能按文件名读取LOCAL INFILE的数据，无法直接使用内存缓冲区，因此经由临时文件
+        """
+        # BaoStock以空字符串表示缺失值，写为\N以载入NULL
+        df = df.mask(df.eq(''))
+        # 文件按ESCAPED BY '\\'载入，字符串中的反斜杠写为\\，否则\t、\n以及字面的\N会被服务器解码
+        for col in df.select_dtypes(include='object').columns:
+            df[col] = df[col].map(lambda v: v.replace('\\', '\\\\') if isinstance(v, str) else v)
+        columns_str = ', '.join(f'`{col}`' for col in df.columns)
+        
+        tmp = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+        tmp.close()
+        try:
+            df.to_csv(tmp.name, index=False, header=False, sep='\t', na_rep='\\N', encoding='utf-8')
+            conn.execute(text(f"""
+                LOAD DATA LOCAL INFILE :path INTO TABLE `{table_name}`
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY '\\t' OPTIONALLY ENCLOSED BY '"' ESCAPED BY '\\\\'
+                LINES TERMINATED BY '\\n'
+                ({columns_str})
+            """), {'path': tmp.name})
+        finally:
+            os.remove(tmp.name)
+    
+    def _get_upsert_sql(self, table_name: str, columns: tuple, primary_keys: tuple) -> str:
+        """获取(表, 字段, 主键)对应的UPSERT语句，首次使用时构建并缓存"""
+        key = (table_name, columns, primary_keys)
+        sql = self._upsert_sql_cache.get(key)
+        if sql is not None:
+            return sql
         
-        # 构建INSERT IGNORE语句
-        columns = list(df.columns)
+        columns_str = ', '.join(f'`{col}`' for col in columns)
         placeholders = ', '.join(['%s'] * len(columns))
-        columns_str = ', '.join([f'`{col}`' for col in columns])
+        # created_at只在插入时写入，更新已有记录时保留
+        updates = ', '.join(f'`{col}` = VALUES(`{col}`)' for col in columns
+                            if col not in primary_keys and col != 'created_at')
+        
+        if updates:
+            sql = f"INSERT INTO `{table_name}` ({columns_str}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {updates}"
+        else:
+            sql = f"INSERT IGNORE INTO `{table_name}` ({columns_str}) VALUES ({placeholders})"
+        
+        self._upsert_sql_cache[key] = sql
+        return sql
+    
+    def _get_upserter(self, table_name: str, columns: tuple, primary_keys: tuple):
+        """
+        获取(表, 字段, 主键)对应的写入函数，首次使用时生成并缓存
+        
+        生成的函数中字段顺序、取值和空字符串转None都已展开为固定代码，SQL作为常量，
+        写入时不再按字段循环或拼接SQL
+        
+        Returns:
+            函数 upserter(conn, rows, batch_size) -> 写入的行数
+        """
+        key = (table_name, columns, primary_keys)
+        upserter = self._upserters.get(key)
+        if upserter is not None:
+            return upserter
+        
+        func_name = '_upsert_' + re.sub(r'\W', '_', table_name)
+        fetches = '; '.join(f'v{i} = get({col!r})' for i, col in enumerate(columns))
+        # BaoStock以空字符串表示缺失值
+        row_tuple = ''.join(f"None if v{i} == '' else v{i}, " for i in range(len(columns)))
+        source = (
+            f"def {func_name}(conn, rows, batch_size):\n"
+            f"    values = []\n"
+            f"    append = values.append\n"
+            f"    for row in rows:\n"
+            f"        get = row.get\n"
+            f"        {fetches}\n"
+            f"        append(({row_tuple}))\n"
+            f"    for i in range(0, len(values), batch_size):\n"
+            f"        conn.exec_driver_sql(SQL, values[i:i + batch_size])\n"
+            f"    return len(values)\n"
+        )
+        namespace = {'SQL': self._get_upsert_sql(table_name, columns, primary_keys)}
+        exec(compile(source, f'<upserter {table_name}>', 'exec'), namespace)
+        
+        upserter = namespace[func_name]
+        self._upserters[key] = upserter
+        return upserter
+    
+    def get_latest_dates_bulk(self, table_name: str, date_column: str, code_column: str,
+                              codes: List[str], chunk_size: int = 1000) -> Dict[str, date]:
+        """
+        一次查询多只股票在表中的最新日期
+        
+        Args:
+            table_name: 表名
+            date_column: 日期字段
+            code_column: 股票代码字段
+            codes: 股票代码列表
+            chunk_size: 每条查询IN列表的最大长度
+            
+        Returns:
+            {股票代码: 最新日期}，表中没有数据的股票不在结果中
+        """
+        stmt = text(
+            f"SELECT `{code_column}`, MAX(`{date_column}`) FROM `{table_name}` "
+            f"WHERE `{code_column}` IN :codes GROUP BY `{code_column}`"
+        ).bindparams(bindparam('codes', expanding=True))
+        
+        latest_dates = {}
+        try:
+            with self.engine.connect() as conn:
+                for i in range(0, len(codes), chunk_size):
+                    result = conn.execute(stmt, {'codes': codes[i:i + chunk_size]})
+                    latest_dates.update((code, latest) for code, latest in result.fetchall())
+            return latest_dates
+            
+        except Exception as e:
+            logger.error(f"查询表 {table_name} 最新日期失败: {str(e)}")
+            raise
+    
+    def query_data(self, sql: str, params: Optional[Dict[str, Any]] = None, chunked: bool = False,
+                   chunk_size: int = 10000) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        """
+        执行查询并以DataFrame返回结果
+        
+        Args:
+            sql: 查询语句，参数使用 :name 形式
+            params: 查询参数
+            chunked: 为True时使用服务端游标流式读取，返回每次chunk_size行的DataFrame迭代器，
+                     结果集很大时避免一次性缓存全部数据
+            chunk_size: 流式读取时每批行数
+            
+        Returns:
+            查询结果DataFrame，chunked为True时为DataFrame迭代器
+        """
+        if chunked:
+            return self._iter_query(sql, params, chunk_size)
+        
+        try:
+            with self.engine.connect() as conn:
+                result = conn.execute(text(sql), params or {})
+                return pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()))
+            
+        except Exception as e:
+            logger.error(f"查询失败: {str(e)}")
+            raise
+    
+    def _iter_query(self, sql: str, params: Optional[Dict[str, Any]], chunk_size: int) -> Iterator[pd.DataFrame]:
+        """使用服务端游标（pymysql的SSCursor）逐批读取查询结果"""
+        with self.engine.connect().execution_options(stream_results=True) as conn:
+            result = conn.execute(text(sql), params or {})
+            columns = list(result.keys())
+            for batch in iter(lambda: result.fetchmany(chunk_size), []):
+                yield pd.DataFrame.from_records(batch, columns=columns)
+    
+    def _upsert_chunk(self, table_name: str, df: pd.DataFrame, primary_keys: List[str], batch_no: int) -> int:
+        """在独立的连接中写入一个批次，批量写入失败时改为逐条写入，返回处理的行数"""
+        try:
+            # 已存在的记录直接更新
+            with self.engine.begin() as conn:
+                self._upsert_batch(conn, table_name, df, primary_keys)
+        except Exception as batch_error:
+            logger.warning(f"批次 {batch_no} 处理失败: {str(batch_error)}")
+            # 尝试逐条写入
+            self._upsert_records_one_by_one(table_name, df, primary_keys)
+        return len(df)
+    
+    def _upsert_batch(self, conn, table_name: str, df: pd.DataFrame, primary_keys: List[str]):
+        """在conn的事务中批量插入/更新记录，使用INSERT ... ON DUPLICATE KEY UPDATE"""
+        if len(df) == 0:
+            return
         
-        sql = f"INSERT IGNORE INTO `{table_name}` ({columns_str}) VALUES ({placeholders})"
+        # 构建UPSERT语句
+        sql = self._get_upsert_sql(table_name, tuple(df.columns), tuple(primary_keys))
         
         # 准备数据
-        values = []
-        for _, row in df.iterrows():
-            row_values = []
-            for val in row.values:
-                if pd.isna(val) or val is None:
-                    row_values.append(None)
-                else:
-                    row_values.append(val)
-            values.append(tuple(row_values))
-        
-        # 执行批量插入
-        self.cursor.executemany(sql, values)
-        self.connection.commit()
+        values = self._to_value_tuples(df)
+        
+        # 执行批量写入
+        conn.exec_driver_sql(sql, values)
     
-    def _insert_records_one_by_one(self, table_name: str, df: pd.DataFrame):
-        """逐条插入记录"""
-        for _, row in df.iterrows():
+    @staticmethod
+    def _to_value_tuples(df: pd.DataFrame) -> List[tuple]:
+        """把DataFrame整体转换为逐行的值元组，NaN和±inf转换为None"""
+        # na_value只处理缺失值，inf需先替换为NaN；一次转为object数组，不逐个单元格判断
+        arr = df.replace([np.inf, -np.inf], np.nan).to_numpy(dtype=object, na_value=None)
+        return list(map(tuple, arr))
+    
+    def _upsert_records_one_by_one(self, table_name: str, df: pd.DataFrame, primary_keys: List[str],
+                                   chunk_size: int = 500):
+        """
+        逐条插入/更新记录，每chunk_size条提交一次
+        
+        每条记录前设置保存点，单条失败时只回滚到该保存点，不影响同一事务中已写入的其他记录
+        """
+        # 构建UPSERT语句
+        sql = self._get_upsert_sql(table_name, tuple(df.columns), tuple(primary_keys))
+        
+        with self.engine.connect() as conn:
+            trans = conn.begin()
             try:
-                # 构建INSERT语句
-                columns = list(row.index)
-                placeholders = ', '.join(['%s'] * len(columns))
-                columns_str = ', '.join([f'`{col}`' for col in columns])
-                
-                sql = f"INSERT IGNORE INTO `{table_name}` ({columns_str}) VALUES ({placeholders})"
-                
-                # 处理NaN值
-                values = []
-                for val in row.values:
-                    if pd.isna(val) or val is None:
-                        values.append(None)
-                    else:
-                        values.append(val)
+                for i, values in enumerate(self._to_value_tuples(df), 1):
+                    savepoint = conn.begin_nested()
+                    try:
+                        conn.exec_driver_sql(sql, values)
+                        savepoint.commit()
+                    except Exception as e:
+                        logger.warning(f"写入单条记录失败: {str(e)}")
+                        savepoint.rollback()
+                    
+                    if i % chunk_size == 0:
+                        trans.commit()
+                        trans = conn.begin()
                 
-                self.cursor.execute(sql, tuple(values))
-                self.connection.commit()
+                trans.commit()
                 
-            except Exception as e:
-                logger.warning(f"插入单条记录失败: {str(e)}")
-                try:
-                    self.connection.rollback()
-                except:
-                    pass
-                continue
+            except Exception:
+                trans.rollback()
+                raise
+    
+    def execute_sql_file(self, sql_file: str, conn=None) -> int:
+        """
+        执行SQL文件中的全部语句
+        
+        用sqlparse拆分语句，字符串、注释或触发器中的分号不会被误拆；DDL没有绑定参数，
+        直接用exec_driver_sql逐条发送，不经过SQLAlchemy的text()解析，也不需要连接开启多语句支持
+        
+        Args:
+            sql_file: SQL文件路径
+            conn: 复用的数据库连接，由调用方提交；不传则新建事务并在结束时提交
+            
+        Returns:
+            执行的语句数
+        """
+        with open(sql_file, 'r', encoding='utf-8') as f:
+            statements = [stmt.strip() for stmt in sqlparse.split(f.read()) if stmt.strip()]
+        
+        with self._transaction(conn) as conn:
+            for stmt in statements:
+                conn.exec_driver_sql(stmt)
+        
+        return len(statements)
+    
+    def create_tables(self, schema_file: str = SCHEMA_FILE):
+        """
+        按schema文件创建表
+        
+        Args:
+            schema_file: schema文件路径，默认为database/schema.sql
+        """
+        try:
+            count = self.execute_sql_file(schema_file)
+            logger.info(f"已执行 {count} 条建表语句: {schema_file}")
+            
+        except Exception as e:
+            logger.error(f"创建表失败: {str(e)}")
+            raise
     
     def create_table_safe(self, table_name: str, columns_info: List[str]):
         """安全创建表"""
@@ -223,10 +642,6 @@ class DatabaseManagerFixed:
     def close(self):
         """关闭连接"""
         try:
-            if self.cursor:
-                self.cursor.close()
-            if self.connection:
-                self.connection.close()
             if self.engine:
                 self.engine.dispose()
             logger.info("数据库连接已关闭")
@@ -267,6 +682,24 @@ def main():
         # 测试数据插入
         db_manager.upsert_data_safe('test_table', test_data, ['code', 'date'])
         
+        # 分区表的列式写入（与按年份分区后的stock_kline相同）
+        with db_manager.engine.begin() as conn:
+            conn.exec_driver_sql("DROP TABLE IF EXISTS test_table_partitioned")
+            conn.exec_driver_sql("""
+                CREATE TABLE test_table_partitioned (
+                    code VARCHAR(20) NOT NULL,
+                    date DATE NOT NULL,
+                    value DECIMAL(20,6),
+                    PRIMARY KEY (code, date)
+                ) PARTITION BY RANGE (YEAR(date)) (
+                    PARTITION p2020 VALUES LESS THAN (2021),
+                    PARTITION pmax VALUES LESS THAN MAXVALUE
+                )
+            """)
+        columns = {key: [row[key] for row in test_data] for key in test_data[0]}
+        db_manager.copy_upsert('test_table_partitioned', columns, ['code', 'date'])
+        db_manager.copy_upsert('test_table_partitioned', columns, ['code', 'date'])
+        
         print("✅ 修复版数据库管理器测试成功")
         
     except Exception as e:
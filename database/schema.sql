@@ -67,7 +67,8 @@ CREATE TABLE IF NOT EXISTS stock_profit (
     PRIMARY KEY (code, statDate),
     INDEX idx_code (code),
     INDEX idx_stat_date (statDate),
-    INDEX idx_pub_date (pubDate)
+    INDEX idx_pub_date (pubDate),
+    INDEX idx_code_pub_date (code, pubDate)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='股票盈利能力数据表';
 
 -- 股票营运能力数据表
@@ -86,7 +87,8 @@ CREATE TABLE IF NOT EXISTS stock_operation (
     PRIMARY KEY (code, statDate),
     INDEX idx_code (code),
     INDEX idx_stat_date (statDate),
-    INDEX idx_pub_date (pubDate)
+    INDEX idx_pub_date (pubDate),
+    INDEX idx_code_pub_date (code, pubDate)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='股票营运能力数据表';
 
 -- 股票成长能力数据表
@@ -104,7 +106,8 @@ CREATE TABLE IF NOT EXISTS stock_growth (
     PRIMARY KEY (code, statDate),
     INDEX idx_code (code),
     INDEX idx_stat_date (statDate),
-    INDEX idx_pub_date (pubDate)
+    INDEX idx_pub_date (pubDate),
+    INDEX idx_code_pub_date (code, pubDate)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='股票成长能力数据表';
 
 -- 股票偿债能力数据表
@@ -123,7 +126,8 @@ CREATE TABLE IF NOT EXISTS stock_balance (
     PRIMARY KEY (code, statDate),
     INDEX idx_code (code),
     INDEX idx_stat_date (statDate),
-    INDEX idx_pub_date (pubDate)
+    INDEX idx_pub_date (pubDate),
+    INDEX idx_code_pub_date (code, pubDate)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='股票偿债能力数据表';
 
 -- 股票现金流量数据表
@@ -143,7 +147,8 @@ CREATE TABLE IF NOT EXISTS stock_cashflow (
     PRIMARY KEY (code, statDate),
     INDEX idx_code (code),
     INDEX idx_stat_date (statDate),
-    INDEX idx_pub_date (pubDate)
+    INDEX idx_pub_date (pubDate),
+    INDEX idx_code_pub_date (code, pubDate)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='股票现金流量数据表';
 
 -- 股票杜邦指标数据表
@@ -164,7 +169,8 @@ CREATE TABLE IF NOT EXISTS stock_dupont (
     PRIMARY KEY (code, statDate),
     INDEX idx_code (code),
     INDEX idx_stat_date (statDate),
-    INDEX idx_pub_date (pubDate)
+    INDEX idx_pub_date (pubDate),
+    INDEX idx_code_pub_date (code, pubDate)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='股票杜邦指标数据表';
 
 -- 股票业绩快报数据表
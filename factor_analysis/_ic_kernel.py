@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+每日IC计算内核
+使用numba编译，按日期并行计算截面秩相关系数；未安装numba时NUMBA_AVAILABLE为False，
+由调用方改用pandas实现
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _average_ranks(x):
+        """计算秩（从1开始，并列值取平均秩），一次argsort后按位置写回"""
+        n = x.shape[0]
+        order = np.argsort(x)
+        ranks = np.empty(n, dtype=np.float64)
+        i = 0
+        while i < n:
+            j = i
+            while j + 1 < n and x[order[j + 1]] == x[order[i]]:
+                j += 1
+            rank = (i + j) / 2.0 + 1.0
+            for k in range(i, j + 1):
+                ranks[order[k]] = rank
+            i = j + 1
+        return ranks
+
+    # 不使用fastmath：其假定不存在NaN，会使下面的缺失值判断失效
+    @njit(parallel=True, cache=True)
+    def per_date_ic(factor, ret, offsets, out, min_count):
+        """
+        按日期并行计算IC
+
+        Args:
+            factor: 按日期排序的因子值，float32或float64（按输入类型分别编译）
+            ret: 与factor对齐的收益率，float32或float64
+            offsets: 各日期在数组中的起始位置，最后一个元素为数组长度（CSR格式）
+            out: 输出数组，长度为日期数；有效样本不足或截面值全部相同时为NaN
+            min_count: 每日最少有效样本数
+        """
+        for d in prange(offsets.shape[0] - 1):
+            start = offsets[d]
+            end = offsets[d + 1]
+
+            # 剔除因子或收益率缺失的样本
+            n = 0
+            for i in range(start, end):
+                if not (np.isnan(factor[i]) or np.isnan(ret[i])):
+                    n += 1
+            if n < min_count:
+                out[d] = np.nan
+                continue
+
+            f = np.empty(n, dtype=np.float64)
+            r = np.empty(n, dtype=np.float64)
+            k = 0
+            for i in range(start, end):
+                if not (np.isnan(factor[i]) or np.isnan(ret[i])):
+                    f[k] = factor[i]
+                    r[k] = ret[i]
+                    k += 1
+
+            # 秩的Pearson相关系数，一次遍历累加各项和
+            rf = _average_ranks(f)
+            rr = _average_ranks(r)
+            sx = sy = sxy = sxx = syy = 0.0
+            for i in range(n):
+                sx += rf[i]
+                sy += rr[i]
+                sxy += rf[i] * rr[i]
+                sxx += rf[i] * rf[i]
+                syy += rr[i] * rr[i]
+
+            denom = (n * sxx - sx * sx) * (n * syy - sy * sy)
+            out[d] = (n * sxy - sx * sy) / np.sqrt(denom) if denom > 0 else np.nan
+
+
+def _as_float_array(values: np.ndarray) -> np.ndarray:
+    """float32保持不变，避免复制为float64；其他类型转换为float64"""
+    return values if values.dtype == np.float32 else values.astype(np.float64)
+
+
+def daily_ic(dates: np.ndarray, factor: np.ndarray, ret: np.ndarray, min_count: int = 10):
+    """
+    计算每日IC，需已安装numba
+
+    Args:
+        dates: 各样本的日期
+        factor: 因子值
+        ret: 收益率
+        min_count: 每日最少有效样本数
+
+    Returns:
+        (日期数组, IC数组)，无法计算的日期IC为NaN
+    """
+    if len(dates) == 0:
+        return dates[:0], np.empty(0, dtype=np.float64)
+
+    # 按日期排序，使同一日期的样本连续
+    order = np.argsort(dates, kind='stable')
+    dates_sorted = dates[order]
+    starts = np.flatnonzero(np.r_[True, dates_sorted[1:] != dates_sorted[:-1]])
+    offsets = np.r_[starts, len(dates_sorted)].astype(np.int64)
+
+    out = np.empty(len(starts), dtype=np.float64)
+    per_date_ic(_as_float_array(factor[order]), _as_float_array(ret[order]), offsets, out, min_count)
+    return dates_sorted[starts], out
@@ -13,6 +13,7 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 import warnings
 import os
+import time
 warnings.filterwarnings('ignore')
 
 # 设置matplotlib中文字体
@@ -20,18 +21,60 @@ plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS', 'DejaVu Sans']
 plt.rcParams['axes.unicode_minus'] = False
 
 from database.manager_fixed import DatabaseManagerFixed
+from factor_analysis._ic_kernel import NUMBA_AVAILABLE, daily_ic
 from sqlalchemy import text
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _rank_1d(x: np.ndarray) -> np.ndarray:
+    """
+    计算一维数组的秩（从1开始，并列值取平均秩），与rank(method='average')相同
+    
+    只做一次argsort再按位置写回，不使用argsort(argsort(x))；没有并列值时不做额外处理
+    """
+    n = x.shape[0]
+    order = np.argsort(x, kind='quicksort')
+    ranks = np.empty(n, dtype=np.float64)
+    ranks[order] = np.arange(1, n + 1)
+    
+    sorted_x = x[order]
+    ties = sorted_x[1:] == sorted_x[:-1]
+    if ties.any():
+        # 每段并列值的起始位置和长度，段内取平均秩
+        starts = np.flatnonzero(np.r_[True, ~ties])
+        counts = np.diff(np.r_[starts, n])
+        ranks[order] = np.repeat(starts + (counts + 1) / 2.0, counts)
+    return ranks
+
+
+def _equal_count_buckets(values: np.ndarray, q: int) -> np.ndarray:
+    """
+    按值从小到大把样本分为q个数量相等的组，返回各样本的组号（0为最小组）
+    
+    只对因子值做一次argsort，不排序整个DataFrame，也不构造pd.qcut的区间；
+    NaN与sort_values一样排在最后
+    """
+    n = len(values)
+    order = np.argsort(values, kind='stable')
+    ranks = np.empty(n, dtype=np.int64)
+    ranks[order] = np.arange(n)
+    return (ranks * q // max(n, 1)).astype(np.int8)
+
+
 class SimpleFactorAnalyzer:
     """简化版单因子分析器"""
     
+    # 因子列检测结果的缓存时间（秒），表结构变更后最多在此时间内仍使用旧结果
+    FACTOR_COLUMNS_TTL = 600
+    
     def __init__(self):
         self.db_manager = DatabaseManagerFixed()
         
+        # {表名: (检测时间, 因子列)}
+        self._factor_cols_cache: Dict[str, Tuple[float, List[str]]] = {}
+        
         # 基础信息列（非因子列）
         self.base_columns = ['code', 'date', 'industry', 'code_name', 'close', 'volume', 'amount', 'pctChg']
         
@@ -54,12 +97,18 @@ class SimpleFactorAnalyzer:
         """
         动态检测因子表中的因子列
         
+        结果按表名缓存FACTOR_COLUMNS_TTL秒，同一表多次分析时不重复查询表结构
+        
         Args:
             table_name: 因子表名
             
         Returns:
             因子列名列表
         """
+        cached = self._factor_cols_cache.get(table_name)
+        if cached is not None and time.monotonic() - cached[0] < self.FACTOR_COLUMNS_TTL:
+            return list(cached[1])
+        
         with self.db_manager.engine.connect() as conn:
             # 获取表结构
             query = f"DESCRIBE {table_name}"
@@ -75,10 +124,27 @@ class SimpleFactorAnalyzer:
                 if col not in self.exclude_columns:
                     factor_columns.append(col)
             
+            self._factor_cols_cache[table_name] = (time.monotonic(), factor_columns)
             logger.info(f"检测到 {len(factor_columns)} 个因子列: {factor_columns[:10]}{'...' if len(factor_columns) > 10 else ''}")
-            return factor_columns
+            return list(factor_columns)
     
-    def get_factor_data(self, start_date: str, end_date: str, table_name: str) -> pd.DataFrame:
+    def _build_factor_query(self, table_name: str, factors: List[str], date_as_days: bool = False) -> str:
+        """
+        构建只选取基础列和指定因子列的查询SQL
+        
+        date_as_days为True时date列以距1970-01-01的天数返回（TO_DAYS('1970-01-01') = 719528）
+        """
+        columns = ', '.join('TO_DAYS(date) - 719528 AS date' if date_as_days and col == 'date' else col
+                            for col in self.base_columns + list(factors))
+        return f"""
+            SELECT {columns}
+            FROM {table_name}
+            WHERE date BETWEEN %(start_date)s AND %(end_date)s
+            ORDER BY code, date
+            """
+    
+    def get_factor_data(self, start_date: str, end_date: str, table_name: str,
+                        factors: Optional[List[str]] = None) -> pd.DataFrame:
         """
         获取因子数据
         
@@ -86,67 +152,114 @@ class SimpleFactorAnalyzer:
             start_date: 开始日期
             end_date: 结束日期
             table_name: 因子表名
+            factors: 需要的因子列，传入时只查询这些因子且不检测表结构；不传则查询全部因子
             
         Returns:
             因子数据DataFrame
         """
         # 检测因子列
-        factor_columns = self.detect_factor_columns(table_name)
+        factor_columns = factors if factors is not None else self.detect_factor_columns(table_name)
         
-        with self.db_manager.engine.connect() as conn:
-            # 构建查询SQL
-            factor_cols = ', '.join(factor_columns)
-            query = f"""
-            SELECT 
-                code, date, industry, code_name,
-                close, volume, amount, pctChg,
-                {factor_cols}
-            FROM {table_name}
-            WHERE date BETWEEN %(start_date)s AND %(end_date)s
-            ORDER BY code, date
-            """
-            
-            df = pd.read_sql(query, conn, params={
+        # 服务端游标逐批取回结果，驱动不在客户端缓存完整结果集
+        with self.db_manager.engine.connect().execution_options(stream_results=True) as conn:
+            df = self._read_factor_frame(conn, self._build_factor_query(table_name, factor_columns, date_as_days=True), {
                 'start_date': start_date,
                 'end_date': end_date
-            })
-            
-            # 确保日期列是datetime类型
-            df['date'] = pd.to_datetime(df['date'])
+            }, float32_columns=factor_columns)
             
             logger.info(f"获取因子数据: {len(df)} 条记录，{len(factor_columns)} 个因子")
             return df
     
+    def _read_factor_frame(self, conn, query: str, params: Dict[str, Any], float32_columns: List[str] = (),
+                           batch_size: int = 10000) -> pd.DataFrame:
+        """
+        用游标分批读取查询结果，数值列直接写入预分配的数组
+        
+        不经过pd.read_sql逐行构造对象再推断类型；数组容量不足时按倍数扩大。
+        code、industry、code_name以Categorical返回。
+        float32_columns中的列（因子列）以float32存储：IC、分层等统计量只需要float32的精度，
+        内存和后续计算的内存带宽减半；其余数值列为float64。
+        date列须以天数返回（见_build_factor_query的date_as_days），最后一次性转换为日期。
+        conn应设置execution_options(stream_results=True)，否则驱动执行查询时已把全部结果读入内存，
+        fetchmany只是分批取出
+        """
+        string_columns = {'code', 'industry', 'code_name'}
+        float32_columns = set(float32_columns)
+        
+        result = conn.exec_driver_sql(query, params)
+        columns = list(result.keys())
+        
+        capacity = batch_size
+        numeric = {col: np.empty(capacity, dtype=np.float32 if col in float32_columns else np.float64)
+                   for col in columns if col not in string_columns}
+        strings = {col: [] for col in columns if col in string_columns}
+        n = 0
+        
+        for rows in iter(lambda: result.fetchmany(batch_size), []):
+            m = len(rows)
+            if n + m > capacity:
+                while n + m > capacity:
+                    capacity *= 2
+                for col, arr in numeric.items():
+                    grown = np.empty(capacity, dtype=arr.dtype)
+                    grown[:n] = arr[:n]
+                    numeric[col] = grown
+            
+            # 按列写入，None转换为NaN
+            for col, values in zip(columns, zip(*rows)):
+                if col in numeric:
+                    numeric[col][n:n + m] = np.array(values, dtype=numeric[col].dtype)
+                else:
+                    strings[col].extend(values)
+            n += m
+        
+        # 字符串列取值重复度高，直接构造为Categorical，后续分组使用整数编码
+        data = {}
+        for col in columns:
+            if col == 'date':
+                data[col] = pd.to_datetime(numeric[col][:n], unit='D')
+            elif col in numeric:
+                data[col] = numeric[col][:n]
+            else:
+                data[col] = pd.Categorical(strings[col])
+        return pd.DataFrame(data, columns=columns)
+    
     def calculate_future_returns(self, df: pd.DataFrame, periods: List[int] = [1, 5, 10]) -> pd.DataFrame:
         """
         计算未来N天收益率排名
         
+        所有周期共用一次股票代码编码，未来收益率直接由close数组错位相除得到，
+        错位后已属于另一只股票的位置置为NaN，不逐周期做groupby+pct_change+shift
+        
         Args:
-            df: 包含价格数据的DataFrame
+            df: 包含价格数据的DataFrame，须按(code, date)排序（get_factor_data的查询已按此排序）
             periods: 未来收益率计算周期列表
             
         Returns:
-            包含未来收益率排名的DataFrame
+            df本身，已添加future_return_{N}d列（原地写入，不复制整个DataFrame）
         """
-        df_returns = df.copy()
+        close = df['close'].to_numpy(dtype=np.float64)
+        code_ids = pd.factorize(df['code'])[0]
+        n = len(close)
         
-        # 按股票代码分组计算未来收益率
         for period in periods:
             # 计算未来N天的收益率
-            future_returns = (
-                df_returns.groupby('code')['close']
-                .pct_change(periods=period)
-                .shift(-period)  # 向前移动，得到未来收益率
-            )
+            future_returns = np.full(n, np.nan)
+            if period < n:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    future_returns[:-period] = close[period:] / close[:-period] - 1
+                future_returns[:-period][code_ids[period:] != code_ids[:-period]] = np.nan
             
             # 对每日收益率进行排名（0-1之间，1表示最高收益）
-            df_returns[f'future_return_{period}d'] = (
-                df_returns.groupby('date')[future_returns.name]
+            df[f'future_return_{period}d'] = (
+                pd.Series(future_returns, index=df.index)
+                .groupby(df['date'], sort=False)
                 .rank(pct=True, method='dense')
+                .astype(np.float32)
             )
         
         logger.info(f"计算未来收益率排名完成，周期: {periods}")
-        return df_returns
+        return df
 
     def calculate_ic(self, factor_values: pd.Series, returns: pd.Series) -> float:
         """
@@ -172,7 +285,99 @@ class SimpleFactorAnalyzer:
         if len(final_idx) < 10:
             return np.nan
         
-        return factor_clean.loc[final_idx].corr(returns_clean.loc[final_idx], method='spearman')
+        # Spearman相关系数即秩的Pearson相关系数
+        factor_ranks = _rank_1d(factor_clean.loc[final_idx].to_numpy(dtype=np.float64))
+        return_ranks = _rank_1d(returns_clean.loc[final_idx].to_numpy(dtype=np.float64))
+        return np.corrcoef(factor_ranks, return_ranks)[0, 1]
+    
+    def calculate_daily_ic(self, df: pd.DataFrame, factor_name: str,
+                           return_column: str = 'future_return_1d', min_count: int = 10) -> pd.Series:
+        """
+        计算每日IC（Spearman秩相关系数）
+        
+        已安装numba时由_ic_kernel按日期并行计算；否则每日截面只排名一次，秩的Pearson相关系数
+        由分组求和的 Σx、Σy、Σxy、Σx²、Σy² 直接算出，不逐日循环调用corr
+        
+        Args:
+            df: 包含date、因子和收益率的数据
+            factor_name: 因子名称
+            return_column: 收益率列
+            min_count: 每日最少有效样本数，不足的日期不计算IC
+            
+        Returns:
+            以日期为索引的IC序列，不含无法计算的日期
+        """
+        if NUMBA_AVAILABLE:
+            dates, ic = daily_ic(df['date'].to_numpy(), df[factor_name].to_numpy(),
+                                 df[return_column].to_numpy(), min_count)
+            return pd.Series(ic, index=dates).dropna()
+        
+        valid = df[['date', factor_name, return_column]].dropna()
+        ranks = valid.groupby('date', sort=False)[[factor_name, return_column]].rank(method='average')
+        x = ranks[factor_name]
+        y = ranks[return_column]
+        
+        grouped = pd.DataFrame({'x': x, 'y': y, 'xy': x * y, 'xx': x * x, 'yy': y * y}).groupby(valid['date'])
+        sums = grouped.sum()
+        n = grouped.size()
+        
+        sums = sums[n >= min_count]
+        n = n[n >= min_count]
+        
+        # 截面上因子或收益率全部相同时分母为0，结果为NaN并被剔除
+        ic = (n * sums['xy'] - sums['x'] * sums['y']) / np.sqrt(
+            (n * sums['xx'] - sums['x'] ** 2) * (n * sums['yy'] - sums['y'] ** 2)
+        )
+        return ic.replace([np.inf, -np.inf], np.nan).dropna()
+    
+    def calculate_all_factor_ic(self, df: pd.DataFrame, factor_names: List[str],
+                                return_column: str = 'future_return_1d', min_count: int = 10,
+                                block_size: int = 16) -> pd.DataFrame:
+        """
+        批量计算多个因子的每日IC
+        
+        每批因子只做一次按日期的分组排名和一次分组求和，不逐个因子重复遍历数据；
+        每个因子的收益率只在该因子有值的样本中排名，结果与calculate_daily_ic相同
+        
+        Args:
+            df: 包含date、因子和收益率的数据
+            factor_names: 因子名称列表
+            return_column: 收益率列
+            min_count: 每日最少有效样本数，不足的日期IC为NaN
+            block_size: 每批同时计算的因子数，限制中间结果的内存占用
+            
+        Returns:
+            日期 × 因子 的IC矩阵
+        """
+        dates = df['date']
+        ret = df[return_column].to_numpy()
+        ret_valid = pd.notna(ret)[:, None]
+        
+        blocks = []
+        for i in range(0, len(factor_names), block_size):
+            names = list(factor_names[i:i + block_size])
+            
+            # 因子或收益率缺失的样本不参与该因子的计算
+            factors = df[names].where(np.broadcast_to(ret_valid, (len(ret), len(names))))
+            valid = factors.notna()
+            returns = pd.DataFrame(np.where(valid, ret[:, None], np.nan), index=df.index, columns=names)
+            
+            ranks = pd.concat({'x': factors, 'y': returns}, axis=1).groupby(dates, sort=False).rank(method='average')
+            x = ranks['x']
+            y = ranks['y']
+            
+            sums = pd.concat({'n': valid, 'x': x, 'y': y, 'xy': x * y, 'xx': x * x, 'yy': y * y},
+                             axis=1).groupby(dates).sum()
+            n = sums['n']
+            
+            ic = (n * sums['xy'] - sums['x'] * sums['y']) / np.sqrt(
+                (n * sums['xx'] - sums['x'] ** 2) * (n * sums['yy'] - sums['y'] ** 2)
+            )
+            blocks.append(ic.where(n >= min_count))
+        
+        if not blocks:
+            return pd.DataFrame()
+        return pd.concat(blocks, axis=1).replace([np.inf, -np.inf], np.nan)
     
     def calculate_quantile_returns(self, df: pd.DataFrame, factor_name: str, 
                                  quantiles: int = 5) -> pd.DataFrame:
@@ -187,31 +392,23 @@ class SimpleFactorAnalyzer:
         Returns:
             分层收益数据
         """
-        quantile_returns = []
+        # 数据点太少的日期跳过
+        sizes = df.groupby('date', sort=False)['date'].transform('size')
+        df = df.loc[sizes >= 20, ['date', factor_name, 'future_return_1d']]
+        if df.empty:
+            return pd.DataFrame()
         
-        for date, group in df.groupby('date'):
-            if len(group) < 20:  # 数据点太少，跳过
-                continue
-            
-            try:
-                # 按因子值排序并分层
-                group_sorted = group.sort_values(factor_name)
-                group_sorted['quantile'] = pd.qcut(range(len(group_sorted)), 
-                                                 quantiles, labels=False, duplicates='drop')
-                
-                # 计算各层收益
-                quantile_stats = group_sorted.groupby('quantile')['future_return_1d'].agg(['mean', 'std', 'count'])
-                quantile_stats['date'] = date
-                quantile_returns.append(quantile_stats.reset_index())
-                
-            except ValueError as e:
-                logger.warning(f"日期 {date} 分层失败: {str(e)}")
-                continue
+        # 每日按因子值分层，因子为NaN的样本排在最后
+        ranks = df.groupby('date', sort=False)[factor_name].rank(method='first', na_option='bottom')
+        quantile = ((ranks - 1) * quantiles // sizes[df.index]).astype(np.int8).rename('quantile')
         
-        if quantile_returns:
-            return pd.concat(quantile_returns, ignore_index=True)
-        else:
-            return pd.DataFrame()
+        # 计算各层收益
+        return (
+            df['future_return_1d']
+            .groupby([quantile, df['date']])
+            .agg(['mean', 'std', 'count'])
+            .reset_index()
+        )
     
     def calculate_overall_quantile_returns(self, df: pd.DataFrame, factor_name: str, 
                                          quantiles: int = 5) -> pd.DataFrame:
@@ -227,13 +424,12 @@ class SimpleFactorAnalyzer:
             分层收益数据
         """
         try:
-            # 按因子值排序并分层
-            df_sorted = df.sort_values(factor_name)
-            df_sorted['quantile'] = pd.qcut(range(len(df_sorted)), 
-                                           quantiles, labels=False, duplicates='drop')
+            # 按因子值分层
+            buckets = pd.Series(_equal_count_buckets(df[factor_name].to_numpy(), quantiles),
+                                index=df.index, name='quantile')
             
             # 计算各层收益统计
-            quantile_stats = df_sorted.groupby('quantile')['future_return_1d'].agg([
+            quantile_stats = df['future_return_1d'].groupby(buckets).agg([
                 'mean', 'std', 'count', 'min', 'max'
             ]).reset_index()
             
@@ -262,43 +458,40 @@ class SimpleFactorAnalyzer:
             详细分组分析结果
         """
         try:
-            # 按因子值排序并分层
-            df_sorted = df.sort_values(factor_name)
-            df_sorted['quantile'] = pd.qcut(range(len(df_sorted)), 
-                                          quantiles, labels=False, duplicates='drop')
-            
-            # 计算各分层的详细统计
-            quantile_analysis = []
-            
-            for q in range(quantiles):
-                q_data = df_sorted[df_sorted['quantile'] == q]
-                if len(q_data) == 0:
-                    continue
-                    
-                # 基础统计
-                stats = {
-                    'quantile': q + 1,
-                    'quantile_label': f'Q{q+1}',
-                    'count': len(q_data),
-                    'factor_mean': q_data[factor_name].mean(),
-                    'factor_std': q_data[factor_name].std(),
-                    'factor_min': q_data[factor_name].min(),
-                    'factor_max': q_data[factor_name].max(),
-                    'return_mean': q_data['future_return_1d'].mean(),
-                    'return_std': q_data['future_return_1d'].std(),
-                    'return_min': q_data['future_return_1d'].min(),
-                    'return_max': q_data['future_return_1d'].max(),
-                    'return_median': q_data['future_return_1d'].median(),
-                    'win_rate': (q_data['future_return_1d'] > 0.5).mean(),  # 排名>0.5的比例
-                    'sharpe_ratio': q_data['future_return_1d'].mean() / q_data['future_return_1d'].std() if q_data['future_return_1d'].std() > 0 else 0
-                }
-                
-                # 计算相对表现（相对于市场平均）
-                market_avg = df_sorted['future_return_1d'].mean()
-                stats['excess_return'] = stats['return_mean'] - market_avg
-                stats['relative_performance'] = stats['return_mean'] / market_avg if market_avg != 0 else 1
-                
-                quantile_analysis.append(stats)
+            # 按因子值分层
+            buckets = _equal_count_buckets(df[factor_name].to_numpy(), quantiles)
+            
+            # 计算各分层的详细统计，所有统计量在一次分组聚合中得到
+            returns = df['future_return_1d']
+            frame = pd.DataFrame({
+                'quantile': buckets,
+                'factor': df[factor_name].to_numpy(),
+                'ret': returns.to_numpy(),
+                'win': (returns > 0.5).to_numpy(dtype=np.float64),  # 排名>0.5的比例
+            })
+            stats = frame.groupby('quantile').agg(
+                count=('factor', 'size'),
+                factor_mean=('factor', 'mean'),
+                factor_std=('factor', 'std'),
+                factor_min=('factor', 'min'),
+                factor_max=('factor', 'max'),
+                return_mean=('ret', 'mean'),
+                return_std=('ret', 'std'),
+                return_min=('ret', 'min'),
+                return_max=('ret', 'max'),
+                return_median=('ret', 'median'),
+                win_rate=('win', 'mean'),
+            )
+            stats['sharpe_ratio'] = np.where(stats['return_std'] > 0, stats['return_mean'] / stats['return_std'], 0)
+            
+            # 计算相对表现（相对于市场平均）
+            market_avg = returns.mean()
+            stats['excess_return'] = stats['return_mean'] - market_avg
+            stats['relative_performance'] = stats['return_mean'] / market_avg if market_avg != 0 else 1
+            
+            stats.insert(0, 'quantile_label', [f'Q{q + 1}' for q in stats.index])
+            stats.insert(0, 'quantile', stats.index + 1)
+            quantile_analysis = stats.to_dict('records')
             
             # 计算分层间的对比指标
             if len(quantile_analysis) >= 2:
@@ -348,7 +541,8 @@ class SimpleFactorAnalyzer:
     
     def analyze_single_factor(self, df: pd.DataFrame, factor_name: str, 
                             quantiles: int = 5, save_plots: bool = True, 
-                            output_dir: str = "factor_analysis_plots") -> Dict[str, Any]:
+                            output_dir: str = "factor_analysis_plots",
+                            ic_values: Optional[List[float]] = None) -> Dict[str, Any]:
         """
         分析单个因子
         
@@ -358,29 +552,21 @@ class SimpleFactorAnalyzer:
             quantiles: 分层数量
             save_plots: 是否保存图表
             output_dir: 图表输出目录
+            ic_values: 已算好的每日IC（见calculate_all_factor_ic），不传则在此计算
             
         Returns:
             分析结果
         """
         try:
-            # 先计算未来收益率
-            df_with_returns = self.calculate_future_returns(df, periods=[1, 5, 10])
+            # 先计算未来收益率；收益率列写入df本身，同一份数据分析多个因子时只计算一次
+            if 'future_return_1d' in df.columns:
+                df_with_returns = df
+            else:
+                df_with_returns = self.calculate_future_returns(df, periods=[1, 5, 10])
             
             # 计算IC（使用1天未来收益率）
-            ic_values = []
-            for date, group in df_with_returns.groupby('date'):
-                if len(group) < 10:
-                    continue
-                
-                # 使用计算好的未来1天收益率
-                group_clean = group.dropna(subset=[factor_name, 'future_return_1d'])
-                if len(group_clean) < 10:
-                    continue
-                
-                # 计算IC
-                ic = self.calculate_ic(group_clean[factor_name], group_clean['future_return_1d'])
-                if not np.isnan(ic):
-                    ic_values.append(ic)
+            if ic_values is None:
+                ic_values = self.calculate_daily_ic(df_with_returns, factor_name).tolist()
             
             # IC统计
             ic_mean = np.mean(ic_values) if ic_values else np.nan
@@ -895,15 +1081,19 @@ class SimpleFactorAnalyzer:
         """
         logger.info(f"开始分析表 {table_name} 中的所有因子")
         
-        # 获取因子数据
-        df = self.get_factor_data(start_date, end_date, table_name)
-        
         # 检测因子列
         factor_columns = self.detect_factor_columns(table_name)
         
         if max_factors:
             factor_columns = factor_columns[:max_factors]
         
+        # 获取因子数据，只查询要分析的因子
+        df = self.get_factor_data(start_date, end_date, table_name, factors=factor_columns)
+        
+        # 未来收益率和所有因子的每日IC只计算一次
+        self.calculate_future_returns(df, periods=[1, 5, 10])
+        ic_matrix = self.calculate_all_factor_ic(df, factor_columns)
+        
         all_results = {}
         summary_stats = []
         
@@ -912,7 +1102,8 @@ class SimpleFactorAnalyzer:
             
             try:
                 # 分析因子
-                result = self.analyze_single_factor(df, factor_name, quantiles, save_plots, output_dir)
+                result = self.analyze_single_factor(df, factor_name, quantiles, save_plots, output_dir,
+                                                    ic_values=ic_matrix[factor_name].dropna().tolist())
                 all_results[factor_name] = result
                 
                 # 添加到汇总统计
@@ -15,6 +15,7 @@ from sqlalchemy import text
 import logging
 from sklearn.linear_model import LinearRegression
 from sklearn.preprocessing import StandardScaler
+from scipy.stats import spearmanr
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -417,10 +418,18 @@ class FactorPreprocessor:
                 
             date_ic = {'date': date}
             
-            for factor in factor_columns:
-                if factor not in group.columns:
-                    continue
-                    
+            # 当日截面没有缺失值时，用spearmanr一次算出所有因子与收益率的相关系数矩阵，
+            # 每列只排名一次，不再逐个因子调用pandas的corr重复排名
+            present = [factor for factor in factor_columns if factor in group.columns]
+            block = group[present + ['future_return']]
+            if len(present) > 1 and len(block) > 5 and not block.isnull().values.any():
+                rho = spearmanr(block.to_numpy(dtype=np.float64))[0]
+                for factor, ic in zip(present, rho[:-1, -1]):
+                    date_ic[f'{factor}_ic'] = ic
+                ic_results.append(date_ic)
+                continue
+            
+            for factor in present:
                 # 计算IC（Spearman相关系数）
                 factor_values = group[factor].dropna()
                 future_returns = group.loc[factor_values.index, 'future_return'].dropna()
@@ -429,7 +438,8 @@ class FactorPreprocessor:
                     # 确保索引对齐
                     common_idx = factor_values.index.intersection(future_returns.index)
                     if len(common_idx) > 5:
-                        ic = factor_values.loc[common_idx].corr(future_returns.loc[common_idx], method='spearman')
+                        ic = spearmanr(factor_values.loc[common_idx].to_numpy(),
+                                       future_returns.loc[common_idx].to_numpy())[0]
                         date_ic[f'{factor}_ic'] = ic
             
             ic_results.append(date_ic)